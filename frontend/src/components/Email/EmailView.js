@@ -7,14 +7,13 @@ import './EmailView.css';
 
 const EmailView = () => {
   const { emailId } = useParams();
-  const { getEmail, deleteEmail, markAsRead, currentEmail, loading } = useEmail();
+  const { getEmail, deleteEmail, currentEmail, loading } = useEmail();
   const navigate = useNavigate();
   const [showReply, setShowReply] = useState(false);
 
   const loadEmail = async () => {
     try {
-      await getEmail(emailId);
-      await markAsRead(emailId);
+      await getEmail(emailId, true);
     } catch (error) {
       console.error('Error loading email:', error);
     }
@@ -1,5 +1,6 @@
 import React from 'react';
 import { FiStar, FiTrash2 } from 'react-icons/fi';
+import EmailService from '../../services/emailService';
 import './EmailViewer.css';
 
 const EmailViewer = ({ email, onClose, onDelete, onStar }) => {
@@ -13,6 +14,24 @@ const EmailViewer = ({ email, onClose, onDelete, onStar }) => {
     });
   };
 
+  const handleDownload = async (attachment, index) => {
+    const link = document.createElement('a');
+    if (attachment.data) {
+      // Older messages still embed the attachment in the message JSON
+      link.href = `data:${attachment.contentType || 'application/octet-stream'};base64,${attachment.data}`;
+    } else {
+      try {
+        const { url } = await EmailService.getAttachmentUrl(email.emailId, index);
+        link.href = url;
+      } catch (err) {
+        alert('Failed to download attachment');
+        return;
+      }
+    }
+    link.download = attachment.filename;
+    link.click();
+  };
+
   const handleDelete = () => {
     if (window.confirm('Are you sure you want to delete this email?')) {
       onDelete(email.emailId);
@@ -83,12 +102,7 @@ const EmailViewer = ({ email, onClose, onDelete, onStar }) => {
                   </div>
                   <button
                     className="attachment-download-btn"
-                    onClick={() => {
-                      const link = document.createElement('a');
-                      link.href = `data:${attachment.contentType || 'application/octet-stream'};base64,${attachment.data}`;
-                      link.download = attachment.filename;
-                      link.click();
-                    }}
+                    onClick={() => handleDownload(attachment, index)}
                   >
                     Download
                   </button>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { signOut } from 'aws-amplify/auth';
 import NavigationBar from './NavigationBar';
 import Sidebar from './Sidebar';
@@ -24,42 +24,40 @@ const GmailLayout = ({ user, onLogout }) => {
     trash: 0,
   });
   const [editingDraftId, setEditingDraftId] = useState(null);
+  const mailboxVersion = useRef(null);
 
   // Load emails when component mounts and when folder changes
   useEffect(() => {
+    pollChanges(true);
     loadEmails();
     loadEmailCounts();
-    // Set up auto-load every 30 seconds
-    const interval = setInterval(() => {
-      loadEmails();
-      loadEmailCounts();
-    }, 30000);
+    // Poll the change log every 30 seconds and only reload when something changed
+    const interval = setInterval(() => pollChanges(false), 30000);
     return () => clearInterval(interval);
     // eslint-disable-next-line
   }, [activeFolder]);
 
+  const pollChanges = async (initial) => {
+    try {
+      const response = await EmailService.listChanges(initial ? null : mailboxVersion.current);
+      mailboxVersion.current = response.version;
+      if (!initial && (response.resync || response.changes?.length > 0)) {
+        loadEmails();
+        loadEmailCounts();
+      }
+    } catch (err) {
+      console.error('Error polling changes:', err);
+    }
+  };
+
   const loadEmails = async () => {
     try {
       setLoading(true);
       console.log('Loading emails for folder:', activeFolder);
       
-      let emailList = [];
-      
-      // For starred folder, fetch all folders and filter by starred
-      if (activeFolder === 'starred') {
-        const folders = ['inbox', 'sent', 'drafts'];
-        const allEmails = [];
-        for (const folder of folders) {
-          const response = await EmailService.listEmails(folder);
-          const folderEmails = response.emails || [];
-          allEmails.push(...folderEmails.filter(e => e.starred));
-        }
-        emailList = allEmails;
-      } else {
-        // For other folders, fetch normally
-        const response = await EmailService.listEmails(activeFolder);
-        emailList = response.emails || [];
-      }
+      // Starred is served server-side from the sparse starred index
+      const response = await EmailService.listEmails(activeFolder);
+      const emailList = response.emails || [];
       
       console.log('Received emails:', emailList);
       console.log('Email count:', emailList.length);
@@ -76,20 +74,8 @@ const GmailLayout = ({ user, onLogout }) => {
 
   const loadEmailCounts = async () => {
     try {
-      const folders = ['inbox', 'sent', 'drafts', 'trash'];
-      const counts = {};
-      for (const folder of folders) {
-        const response = await EmailService.listEmails(folder);
-        counts[folder] = response.emails?.length || 0;
-      }
-      // Get starred count from all folders (inbox, sent, drafts)
-      let starredCount = 0;
-      const starredFolders = ['inbox', 'sent', 'drafts'];
-      for (const folder of starredFolders) {
-        const response = await EmailService.listEmails(folder);
-        starredCount += (response.emails?.filter(e => e.starred)?.length || 0);
-      }
-      counts.starred = starredCount;
+      const response = await EmailService.getEmailCounts();
+      const counts = response.counts || {};
       setEmailCounts(counts);
     } catch (err) {
       console.error('Error loading email counts:', err);
@@ -122,12 +108,11 @@ const GmailLayout = ({ user, onLogout }) => {
   const handleEmailSelect = async (email) => {
     try {
       console.log('Fetching full email:', email.emailId);
-      const fullEmail = await EmailService.getEmail(email.emailId);
+      // Unread emails are marked as read by the same request
+      const fullEmail = await EmailService.getEmail(email.emailId, !email.read);
       console.log('Full email loaded:', fullEmail);
       setSelectedEmail(fullEmail);
-      // Mark as read
       if (!email.read) {
-        await EmailService.markAsRead(email.emailId);
         // Reload emails to update read status
         await loadEmails();
       }
@@ -31,7 +31,12 @@ export const apiConfig = {
   endpoints: {
     sendEmail: '/emails/send',
     listEmails: '/emails',
+    emailCounts: '/emails/counts',
+    emailChanges: '/emails/changes',
     getEmail: '/emails',
+    batchGetEmails: '/emails/batch-get',
+    bulkEmails: '/emails/bulk',
+    folderJobs: '/emails/jobs',
     deleteEmail: '/emails'
   }
 };
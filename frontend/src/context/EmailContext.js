@@ -32,12 +32,17 @@ export const EmailProvider = ({ children }) => {
     }
   }, []);
 
-  const getEmail = useCallback(async (emailId) => {
+  const getEmail = useCallback(async (emailId, markRead = false) => {
     setLoading(true);
     setError(null);
     try {
-      const email = await emailService.getEmail(emailId);
+      const email = await emailService.getEmail(emailId, markRead);
       setCurrentEmail(email);
+      if (markRead) {
+        setEmails(current => current.map(item =>
+          item.emailId === emailId ? { ...item, read: true } : item
+        ));
+      }
       return email;
     } catch (err) {
       setError(err.message);
@@ -4,6 +4,8 @@ import { apiConfig } from '../config/aws-config';
 class EmailService {
   constructor() {
     this.apiEndpoint = process.env.REACT_APP_API_ENDPOINT;
+    // Last listing per URL, revalidated with If-None-Match
+    this.listCache = new Map();
   }
 
   async getAuthHeaders() {
@@ -21,19 +23,37 @@ class EmailService {
     }
   }
 
-  async listEmails(folder = 'inbox', limit = 50) {
+  async listEmails(folder = 'inbox', limit = 50, nextToken = null, filter = null) {
     try {
       const headers = await this.getAuthHeaders();
-      const response = await fetch(
-        `${this.apiEndpoint}${apiConfig.endpoints.listEmails}?folder=${folder}&limit=${limit}`,
-        { headers }
-      );
+      const params = new URLSearchParams({ folder, limit });
+      if (nextToken) {
+        params.append('nextToken', nextToken);
+      }
+      if (filter) {
+        params.append('filter', filter);
+      }
+      const url = `${this.apiEndpoint}${apiConfig.endpoints.listEmails}?${params.toString()}`;
+      const cached = this.listCache.get(url);
+      if (cached) {
+        headers['If-None-Match'] = cached.etag;
+      }
+
+      const response = await fetch(url, { headers });
+
+      if (response.status === 304 && cached) {
+        return cached.data;
+      }
 
       if (!response.ok) {
         throw new Error(`Failed to fetch emails: ${response.statusText}`);
       }
 
       const data = await response.json();
+      const etag = response.headers.get('ETag');
+      if (etag) {
+        this.listCache.set(url, { etag, data });
+      }
       return data;
     } catch (error) {
       console.error('Error listing emails:', error);
@@ -41,11 +61,51 @@ class EmailService {
     }
   }
 
-  async getEmail(emailId) {
+  async getEmailCounts() {
+    try {
+      const headers = await this.getAuthHeaders();
+      const response = await fetch(
+        `${this.apiEndpoint}${apiConfig.endpoints.emailCounts}`,
+        { headers }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to fetch email counts: ${response.statusText}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error getting email counts:', error);
+      throw error;
+    }
+  }
+
+  async listChanges(since = null) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const query = since !== null ? `?since=${since}` : '';
+      const response = await fetch(
+        `${this.apiEndpoint}${apiConfig.endpoints.emailChanges}${query}`,
+        { headers }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to fetch changes: ${response.statusText}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error listing changes:', error);
+      throw error;
+    }
+  }
+
+  async getEmail(emailId, markRead = false) {
     try {
       const headers = await this.getAuthHeaders();
+      const query = markRead ? '?markRead=true' : '';
       const response = await fetch(
-        `${this.apiEndpoint}${apiConfig.endpoints.getEmail}/${emailId}`,
+        `${this.apiEndpoint}${apiConfig.endpoints.getEmail}/${emailId}${query}`,
         { headers }
       );
 
@@ -60,6 +120,124 @@ class EmailService {
     }
   }
 
+  async batchGetEmails(emailIds) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const result = { emails: [], errors: [] };
+      // The server stops before its response size limit and hands back the
+      // IDs it didn't get to; keep asking until they're all answered
+      let pending = emailIds;
+      while (pending.length > 0) {
+        const response = await fetch(
+          `${this.apiEndpoint}${apiConfig.endpoints.batchGetEmails}`,
+          {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({ emailIds: pending })
+          }
+        );
+
+        if (!response.ok) {
+          throw new Error(`Failed to fetch emails: ${response.statusText}`);
+        }
+
+        const data = await response.json();
+        result.emails.push(...data.emails);
+        result.errors.push(...data.errors);
+        pending = data.unprocessedIds || [];
+      }
+
+      return result;
+    } catch (error) {
+      console.error('Error batch getting emails:', error);
+      throw error;
+    }
+  }
+
+  async bulkUpdateEmails(emailIds, action, folder = null) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const response = await fetch(
+        `${this.apiEndpoint}${apiConfig.endpoints.bulkEmails}`,
+        {
+          method: 'POST',
+          headers,
+          body: JSON.stringify(folder ? { emailIds, action, folder } : { emailIds, action })
+        }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to update emails: ${response.statusText}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error bulk updating emails:', error);
+      throw error;
+    }
+  }
+
+  async startFolderJob(action, folder = null) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const response = await fetch(
+        `${this.apiEndpoint}${apiConfig.endpoints.folderJobs}`,
+        {
+          method: 'POST',
+          headers,
+          body: JSON.stringify(folder ? { action, folder } : { action })
+        }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to start job: ${response.statusText}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error starting folder job:', error);
+      throw error;
+    }
+  }
+
+  async getFolderJob(jobId) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const response = await fetch(
+        `${this.apiEndpoint}${apiConfig.endpoints.folderJobs}/${jobId}`,
+        { headers }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to get job: ${response.statusText}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error getting folder job:', error);
+      throw error;
+    }
+  }
+
+  async getAttachmentUrl(emailId, index) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const response = await fetch(
+        `${this.apiEndpoint}${apiConfig.endpoints.getEmail}/${emailId}/attachments/${index}`,
+        { headers }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to get attachment: ${response.statusText}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error getting attachment:', error);
+      throw error;
+    }
+  }
+
   async sendEmail(emailData) {
     try {
       const headers = await this.getAuthHeaders();
@@ -135,6 +313,28 @@ class EmailService {
     }
   }
 
+  async markAsUnread(emailId) {
+    try {
+      const headers = await this.getAuthHeaders();
+      const response = await fetch(
+        `${this.apiEndpoint}${apiConfig.endpoints.getEmail}/${emailId}/unread`,
+        {
+          method: 'PUT',
+          headers
+        }
+      );
+
+      if (!response.ok) {
+        throw new Error(`Failed to mark email as unread: ${response.statusText}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error marking email as unread:', error);
+      throw error;
+    }
+  }
+
   async markAsStarred(emailId, starred) {
     try {
       const headers = await this.getAuthHeaders();
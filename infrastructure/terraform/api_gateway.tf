@@ -7,6 +7,9 @@ resource "aws_api_gateway_rest_api" "vmail" {
     types = ["REGIONAL"]
   }
 
+  # Lets Lambda proxy responses return compressed (base64) bodies
+  binary_media_types = ["*/*"]
+
   tags = local.common_tags
 }
 
@@ -40,6 +43,68 @@ resource "aws_api_gateway_resource" "email_read" {
   path_part   = "read"
 }
 
+# /emails/{emailId}/attachments/{index} resource
+resource "aws_api_gateway_resource" "email_attachments" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.email_id.id
+  path_part   = "attachments"
+}
+
+resource "aws_api_gateway_resource" "email_attachment" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.email_attachments.id
+  path_part   = "{index}"
+}
+
+# /emails/{emailId}/unread resource
+resource "aws_api_gateway_resource" "email_unread" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.email_id.id
+  path_part   = "unread"
+}
+
+# /emails/counts resource
+resource "aws_api_gateway_resource" "counts" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.emails.id
+  path_part   = "counts"
+}
+
+# /emails/changes resource
+resource "aws_api_gateway_resource" "changes" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.emails.id
+  path_part   = "changes"
+}
+
+# /emails/batch-get resource
+resource "aws_api_gateway_resource" "batch_get" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.emails.id
+  path_part   = "batch-get"
+}
+
+# /emails/jobs resource
+resource "aws_api_gateway_resource" "jobs" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.emails.id
+  path_part   = "jobs"
+}
+
+# /emails/jobs/{jobId} resource
+resource "aws_api_gateway_resource" "job" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.jobs.id
+  path_part   = "{jobId}"
+}
+
+# /emails/bulk resource
+resource "aws_api_gateway_resource" "bulk" {
+  rest_api_id = aws_api_gateway_rest_api.vmail.id
+  parent_id   = aws_api_gateway_resource.emails.id
+  path_part   = "bulk"
+}
+
 # /emails/send resource
 resource "aws_api_gateway_resource" "send" {
   rest_api_id = aws_api_gateway_rest_api.vmail.id
@@ -75,6 +140,34 @@ module "list_emails_method" {
   lambda_name   = aws_lambda_function.list_emails.function_name
 }
 
+# GET /emails/counts - Sidebar Counters
+module "get_counts_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.counts.id
+  http_method   = "GET"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.get_counts.arn
+  lambda_name   = aws_lambda_function.get_counts.function_name
+}
+
+# GET /emails/changes - Delta Sync
+module "list_changes_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.changes.id
+  http_method   = "GET"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.list_changes.arn
+  lambda_name   = aws_lambda_function.list_changes.function_name
+}
+
 # GET /emails/{emailId} - Get Email
 module "get_email_method" {
   source = "./modules/api_method"
@@ -89,6 +182,77 @@ module "get_email_method" {
   lambda_name   = aws_lambda_function.get_email.function_name
 }
 
+# POST /emails/batch-get - Get Several Emails
+module "batch_get_emails_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.batch_get.id
+  http_method   = "POST"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.batch_get_emails.arn
+  lambda_name   = aws_lambda_function.batch_get_emails.function_name
+}
+
+# POST /emails/bulk - Apply One Action to Many Emails
+module "bulk_emails_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.bulk.id
+  http_method   = "POST"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.bulk_emails.arn
+  lambda_name   = aws_lambda_function.bulk_emails.function_name
+}
+
+# POST /emails/jobs - Start Folder-Wide Job
+module "start_folder_job_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.jobs.id
+  http_method   = "POST"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.folder_jobs.arn
+  lambda_name   = aws_lambda_function.folder_jobs.function_name
+}
+
+# GET /emails/jobs/{jobId} - Folder-Wide Job Status
+module "get_folder_job_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.job.id
+  http_method   = "GET"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.folder_jobs.arn
+  lambda_name   = aws_lambda_function.folder_jobs.function_name
+  statement_id  = "AllowAPIGatewayInvokeJobStatus"
+}
+
+# GET /emails/{emailId}/attachments/{index} - Attachment Download URL
+module "get_attachment_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.email_attachment.id
+  http_method   = "GET"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.get_attachment.arn
+  lambda_name   = aws_lambda_function.get_attachment.function_name
+}
+
 # DELETE /emails/{emailId} - Delete Email
 module "delete_email_method" {
   source = "./modules/api_method"
@@ -117,6 +281,21 @@ module "mark_read_method" {
   lambda_name   = aws_lambda_function.mark_read.function_name
 }
 
+# PUT /emails/{emailId}/unread - Mark as Unread
+module "mark_unread_method" {
+  source = "./modules/api_method"
+
+  rest_api_id   = aws_api_gateway_rest_api.vmail.id
+  aws_region    = var.aws_region
+  account_id    = local.account_id
+  resource_id   = aws_api_gateway_resource.email_unread.id
+  http_method   = "PUT"
+  authorizer_id = aws_api_gateway_authorizer.cognito.id
+  lambda_arn    = aws_lambda_function.mark_read.arn
+  lambda_name   = aws_lambda_function.mark_read.function_name
+  statement_id  = "AllowAPIGatewayInvokeUnread"
+}
+
 # API Gateway Deployment
 resource "aws_api_gateway_deployment" "vmail" {
   rest_api_id = aws_api_gateway_rest_api.vmail.id
@@ -124,9 +303,17 @@ resource "aws_api_gateway_deployment" "vmail" {
   depends_on = [
     module.send_email_method,
     module.list_emails_method,
+    module.get_counts_method,
+    module.list_changes_method,
     module.get_email_method,
+    module.batch_get_emails_method,
+    module.bulk_emails_method,
+    module.start_folder_job_method,
+    module.get_folder_job_method,
+    module.get_attachment_method,
     module.delete_email_method,
-    module.mark_read_method
+    module.mark_read_method,
+    module.mark_unread_method
   ]
 
   lifecycle {
@@ -23,6 +23,11 @@ resource "aws_cognito_user_pool" "vmail" {
     }
   }
 
+  # Keep the recipient address -> user mapping used by inbound mail in sync
+  lambda_config {
+    post_confirmation = aws_lambda_function.cognito_post_confirmation.arn
+  }
+
   # Email configuration
   email_configuration {
     email_sending_account = "COGNITO_DEFAULT"
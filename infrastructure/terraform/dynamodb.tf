@@ -1,3 +1,11 @@
+# Attributes returned by list-emails; the list indexes project only these
+locals {
+  email_list_attributes = [
+    "from", "to", "subject", "preview", "timestamp", "read",
+    "starred", "hasAttachments", "isDraft", "folder"
+  ]
+}
+
 # DynamoDB Table for Email Metadata
 resource "aws_dynamodb_table" "emails" {
   name           = "${var.project_name}-emails"
@@ -15,31 +23,62 @@ resource "aws_dynamodb_table" "emails" {
   }
 
   attribute {
-    name = "folder"
+    name = "userFolder"
+    type = "S"
+  }
+
+  attribute {
+    name = "folderSortKey"
+    type = "S"
+  }
+
+  attribute {
+    name = "starredAt"
     type = "S"
   }
 
   attribute {
-    name = "timestamp"
+    name = "unreadKey"
     type = "S"
   }
 
-  # GSI for querying by userId and folder
+  # GSI for folder listings: "<userId>#<folder>" ordered by "<timestamp>#<emailId>"
   global_secondary_index {
-    name            = "userId-folder-index"
-    hash_key        = "userId"
-    range_key       = "folder"
-    projection_type = "ALL"
+    name               = "userFolder-folderSortKey-index"
+    hash_key           = "userFolder"
+    range_key          = "folderSortKey"
+    projection_type    = "INCLUDE"
+    non_key_attributes = local.email_list_attributes
   }
 
-  # GSI for querying by userId and timestamp
+  # Sparse GSI: only starred items carry starredAt
   global_secondary_index {
-    name            = "userId-timestamp-index"
-    hash_key        = "userId"
-    range_key       = "timestamp"
-    projection_type = "ALL"
+    name               = "userId-starredAt-index"
+    hash_key           = "userId"
+    range_key          = "starredAt"
+    projection_type    = "INCLUDE"
+    non_key_attributes = local.email_list_attributes
   }
 
+  # Sparse GSI: only unread items carry unreadKey (same value as folderSortKey)
+  global_secondary_index {
+    name               = "userFolder-unreadKey-index"
+    hash_key           = "userFolder"
+    range_key          = "unreadKey"
+    projection_type    = "INCLUDE"
+    non_key_attributes = local.email_list_attributes
+  }
+
+  # Trashed emails carry expiresAt and are removed in the background;
+  # the stream lets the trash-expiry Lambda clean up after them
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
+  }
+
+  stream_enabled   = true
+  stream_view_type = "OLD_IMAGE"
+
   # Enable point-in-time recovery
   point_in_time_recovery {
     enabled = true
@@ -53,6 +92,75 @@ resource "aws_dynamodb_table" "emails" {
   tags = local.common_tags
 }
 
+# DynamoDB Table for per-user mailbox state (counters, version, change log)
+resource "aws_dynamodb_table" "mailbox" {
+  name           = "${var.project_name}-mailbox"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "userId"
+  range_key      = "recordKey"
+
+  attribute {
+    name = "userId"
+    type = "S"
+  }
+
+  attribute {
+    name = "recordKey"
+    type = "S"
+  }
+
+  # Change-log entries expire once clients can no longer delta-sync from them
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
+  }
+
+  # Enable encryption
+  server_side_encryption {
+    enabled = true
+  }
+
+  tags = local.common_tags
+}
+
+# DynamoDB Table mapping recipient addresses to Cognito subs for inbound mail
+resource "aws_dynamodb_table" "user_emails" {
+  name           = "${var.project_name}-user-emails"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "email"
+
+  attribute {
+    name = "email"
+    type = "S"
+  }
+
+  # Enable encryption
+  server_side_encryption {
+    enabled = true
+  }
+
+  tags = local.common_tags
+}
+
+# DynamoDB Table reference-counting inbound bodies shared across recipients
+resource "aws_dynamodb_table" "bodies" {
+  name           = "${var.project_name}-bodies"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "bodyRef"
+
+  attribute {
+    name = "bodyRef"
+    type = "S"
+  }
+
+  # Enable encryption
+  server_side_encryption {
+    enabled = true
+  }
+
+  tags = local.common_tags
+}
+
 # Output
 output "dynamodb_table_name" {
   value       = aws_dynamodb_table.emails.name
@@ -63,3 +171,18 @@ output "dynamodb_table_arn" {
   value       = aws_dynamodb_table.emails.arn
   description = "DynamoDB table ARN"
 }
+
+output "dynamodb_mailbox_table_name" {
+  value       = aws_dynamodb_table.mailbox.name
+  description = "DynamoDB mailbox state table name"
+}
+
+output "dynamodb_user_emails_table_name" {
+  value       = aws_dynamodb_table.user_emails.name
+  description = "DynamoDB recipient address to user table name"
+}
+
+output "dynamodb_bodies_table_name" {
+  value       = aws_dynamodb_table.bodies.name
+  description = "DynamoDB shared body reference count table name"
+}
@@ -39,6 +39,8 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:PutItem",
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
@@ -47,7 +49,10 @@ resource "aws_iam_role_policy" "lambda_policy" {
         ]
         Resource = [
           aws_dynamodb_table.emails.arn,
-          "${aws_dynamodb_table.emails.arn}/index/*"
+          "${aws_dynamodb_table.emails.arn}/index/*",
+          aws_dynamodb_table.mailbox.arn,
+          aws_dynamodb_table.user_emails.arn,
+          aws_dynamodb_table.bodies.arn
         ]
       },
       {
@@ -73,6 +78,38 @@ resource "aws_iam_role_policy" "lambda_policy" {
           "sns:Publish"
         ]
         Resource = aws_sns_topic.email_notifications.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.inbound.arn
+      },
+      {
+        Effect   = "Allow"
+        Action   = "sqs:SendMessage"
+        Resource = aws_sqs_queue.trash_expiry_dlq.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:DescribeStream",
+          "dynamodb:ListStreams"
+        ]
+        Resource = aws_dynamodb_table.emails.stream_arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction"
+        ]
+        # Folder-wide jobs hand off to a fresh invocation of themselves
+        Resource = "arn:aws:lambda:${var.aws_region}:${local.account_id}:function:${var.project_name}-folder-jobs"
       }
     ]
   })
@@ -91,6 +128,7 @@ resource "aws_lambda_function" "send_email" {
   environment {
     variables = {
       DYNAMODB_TABLE        = aws_dynamodb_table.emails.name
+      MAILBOX_TABLE         = aws_dynamodb_table.mailbox.name
       S3_BUCKET             = aws_s3_bucket.emails.id
       SENDGRID_API_KEY      = var.sendgrid_api_key
       SENDGRID_FROM_EMAIL   = var.sendgrid_from_email
@@ -113,6 +151,7 @@ resource "aws_lambda_function" "list_emails" {
   environment {
     variables = {
       DYNAMODB_TABLE = aws_dynamodb_table.emails.name
+      MAILBOX_TABLE  = aws_dynamodb_table.mailbox.name
     }
   }
 
@@ -129,6 +168,144 @@ resource "aws_lambda_function" "get_email" {
   timeout         = 30
   memory_size     = 256
 
+  environment {
+    variables = {
+      DYNAMODB_TABLE = aws_dynamodb_table.emails.name
+      MAILBOX_TABLE  = aws_dynamodb_table.mailbox.name
+      S3_BUCKET      = aws_s3_bucket.emails.id
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Lambda Function: Batch Get Emails
+resource "aws_lambda_function" "batch_get_emails" {
+  filename         = "${path.module}/batch-get-emails.zip"
+  function_name    = "${var.project_name}-batch-get-emails"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 30
+  memory_size     = 512
+
+  environment {
+    variables = {
+      DYNAMODB_TABLE = aws_dynamodb_table.emails.name
+      S3_BUCKET      = aws_s3_bucket.emails.id
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Lambda Function: Bulk Emails
+resource "aws_lambda_function" "bulk_emails" {
+  filename         = "${path.module}/bulk-emails.zip"
+  function_name    = "${var.project_name}-bulk-emails"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 30
+  memory_size     = 256
+
+  environment {
+    variables = {
+      DYNAMODB_TABLE       = aws_dynamodb_table.emails.name
+      MAILBOX_TABLE        = aws_dynamodb_table.mailbox.name
+      BODIES_TABLE         = aws_dynamodb_table.bodies.name
+      TRASH_RETENTION_DAYS = var.trash_retention_days
+      S3_BUCKET            = aws_s3_bucket.emails.id
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Lambda Function: Folder Jobs (mark all read, empty trash)
+resource "aws_lambda_function" "folder_jobs" {
+  filename         = "${path.module}/folder-jobs.zip"
+  function_name    = "${var.project_name}-folder-jobs"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 300
+  memory_size     = 256
+
+  environment {
+    variables = {
+      DYNAMODB_TABLE = aws_dynamodb_table.emails.name
+      MAILBOX_TABLE  = aws_dynamodb_table.mailbox.name
+      BODIES_TABLE   = aws_dynamodb_table.bodies.name
+      S3_BUCKET      = aws_s3_bucket.emails.id
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Lambda Function: Trash Expiry (DynamoDB stream consumer)
+resource "aws_lambda_function" "trash_expiry" {
+  filename         = "${path.module}/trash-expiry.zip"
+  function_name    = "${var.project_name}-trash-expiry"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 60
+  memory_size     = 256
+
+  environment {
+    variables = {
+      MAILBOX_TABLE = aws_dynamodb_table.mailbox.name
+      BODIES_TABLE  = aws_dynamodb_table.bodies.name
+      S3_BUCKET     = aws_s3_bucket.emails.id
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Only TTL deletions reach the consumer; user deletes clean up inline.
+# Records that keep failing are split out and sent to the failure queue
+# instead of blocking the shard.
+resource "aws_lambda_event_source_mapping" "trash_expiry_stream" {
+  event_source_arn               = aws_dynamodb_table.emails.stream_arn
+  function_name                  = aws_lambda_function.trash_expiry.arn
+  starting_position              = "LATEST"
+  batch_size                     = 100
+  function_response_types        = ["ReportBatchItemFailures"]
+  maximum_retry_attempts         = 5
+  bisect_batch_on_function_error = true
+
+  destination_config {
+    on_failure {
+      destination_arn = aws_sqs_queue.trash_expiry_dlq.arn
+    }
+  }
+
+  filter_criteria {
+    filter {
+      pattern = jsonencode({
+        eventName = ["REMOVE"]
+        userIdentity = {
+          type        = ["Service"]
+          principalId = ["dynamodb.amazonaws.com"]
+        }
+      })
+    }
+  }
+}
+
+# Lambda Function: Get Attachment
+resource "aws_lambda_function" "get_attachment" {
+  filename         = "${path.module}/get-attachment.zip"
+  function_name    = "${var.project_name}-get-attachment"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 30
+  memory_size     = 256
+
   environment {
     variables = {
       DYNAMODB_TABLE = aws_dynamodb_table.emails.name
@@ -151,8 +328,11 @@ resource "aws_lambda_function" "delete_email" {
 
   environment {
     variables = {
-      DYNAMODB_TABLE = aws_dynamodb_table.emails.name
-      S3_BUCKET      = aws_s3_bucket.emails.id
+      DYNAMODB_TABLE       = aws_dynamodb_table.emails.name
+      MAILBOX_TABLE        = aws_dynamodb_table.mailbox.name
+      BODIES_TABLE         = aws_dynamodb_table.bodies.name
+      TRASH_RETENTION_DAYS = var.trash_retention_days
+      S3_BUCKET            = aws_s3_bucket.emails.id
     }
   }
 
@@ -172,6 +352,45 @@ resource "aws_lambda_function" "mark_read" {
   environment {
     variables = {
       DYNAMODB_TABLE = aws_dynamodb_table.emails.name
+      MAILBOX_TABLE  = aws_dynamodb_table.mailbox.name
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Lambda Function: Get Counts
+resource "aws_lambda_function" "get_counts" {
+  filename         = "${path.module}/get-counts.zip"
+  function_name    = "${var.project_name}-get-counts"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 30
+  memory_size     = 256
+
+  environment {
+    variables = {
+      MAILBOX_TABLE = aws_dynamodb_table.mailbox.name
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Lambda Function: List Changes
+resource "aws_lambda_function" "list_changes" {
+  filename         = "${path.module}/list-changes.zip"
+  function_name    = "${var.project_name}-list-changes"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 30
+  memory_size     = 256
+
+  environment {
+    variables = {
+      MAILBOX_TABLE = aws_dynamodb_table.mailbox.name
     }
   }
 
@@ -186,19 +405,50 @@ resource "aws_lambda_function" "receive_email" {
   handler         = "lambda_function.lambda_handler"
   runtime         = "python3.9"
   timeout         = 60
-  memory_size     = 512
+  memory_size     = 256
 
   environment {
     variables = {
       DYNAMODB_TABLE = aws_dynamodb_table.emails.name
-      S3_BUCKET      = aws_s3_bucket.emails.id
-      SNS_TOPIC_ARN  = aws_sns_topic.email_notifications.arn
+      MAILBOX_TABLE      = aws_dynamodb_table.mailbox.name
+      USER_EMAILS_TABLE  = aws_dynamodb_table.user_emails.name
+      BODIES_TABLE       = aws_dynamodb_table.bodies.name
+      S3_BUCKET          = aws_s3_bucket.emails.id
+      SNS_TOPIC_ARN      = aws_sns_topic.email_notifications.arn
     }
   }
 
   tags = local.common_tags
 }
 
+# Lambda Function: Cognito post-confirmation hook (address -> user mapping)
+resource "aws_lambda_function" "cognito_post_confirmation" {
+  filename         = "${path.module}/cognito-post-confirmation.zip"
+  function_name    = "${var.project_name}-cognito-post-confirmation"
+  role            = aws_iam_role.lambda_execution.arn
+  handler         = "lambda_function.lambda_handler"
+  runtime         = "python3.9"
+  timeout         = 5
+  memory_size     = 128
+
+  environment {
+    variables = {
+      USER_EMAILS_TABLE = aws_dynamodb_table.user_emails.name
+    }
+  }
+
+  tags = local.common_tags
+}
+
+# Lambda Permission for Cognito
+resource "aws_lambda_permission" "cognito_post_confirmation" {
+  statement_id  = "AllowExecutionFromCognito"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.cognito_post_confirmation.function_name
+  principal     = "cognito-idp.amazonaws.com"
+  source_arn    = aws_cognito_user_pool.vmail.arn
+}
+
 # Note: Email receiving is now enabled for us-east-1
 
 # Lambda Permission for SES
@@ -210,26 +460,14 @@ resource "aws_lambda_permission" "ses_receive" {
   source_account = local.account_id
 }
 
-# Lambda Permission for S3
-resource "aws_lambda_permission" "s3_receive" {
-  statement_id  = "AllowExecutionFromS3"
-  action        = "lambda:InvokeFunction"
-  function_name = aws_lambda_function.receive_email.function_name
-  principal     = "s3.amazonaws.com"
-  source_arn    = aws_s3_bucket.emails.arn
-}
-
-# S3 Bucket Notification
-resource "aws_s3_bucket_notification" "email_received" {
-  bucket = aws_s3_bucket.emails.id
-
-  lambda_function {
-    lambda_function_arn = aws_lambda_function.receive_email.arn
-    events              = ["s3:ObjectCreated:*"]
-    filter_prefix       = "incoming/"
-  }
-
-  depends_on = [aws_lambda_permission.s3_receive]
+# Inbound mail arrives through the SQS queue in batches; failed messages
+# are reported individually so only those are retried
+resource "aws_lambda_event_source_mapping" "receive_email_queue" {
+  event_source_arn                   = aws_sqs_queue.inbound.arn
+  function_name                      = aws_lambda_function.receive_email.arn
+  batch_size                         = 10
+  maximum_batching_window_in_seconds = 5
+  function_response_types            = ["ReportBatchItemFailures"]
 }
 
 # Outputs
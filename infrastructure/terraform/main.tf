@@ -43,6 +43,12 @@ variable "sendgrid_from_email" {
   default     = "noreply@vmail.com"
 }
 
+variable "trash_retention_days" {
+  description = "Days an email stays in trash before it expires"
+  type        = number
+  default     = 30
+}
+
 # Data sources
 data "aws_caller_identity" "current" {}
 
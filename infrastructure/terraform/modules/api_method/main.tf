@@ -30,6 +30,12 @@ variable "lambda_name" {
   type = string
 }
 
+# Must be unique per Lambda when one function backs several methods
+variable "statement_id" {
+  type    = string
+  default = "AllowAPIGatewayInvoke"
+}
+
 # API Gateway Method
 resource "aws_api_gateway_method" "method" {
   rest_api_id   = var.rest_api_id
@@ -51,7 +57,7 @@ resource "aws_api_gateway_integration" "integration" {
 
 # Lambda Permission
 resource "aws_lambda_permission" "api_gateway" {
-  statement_id  = "AllowAPIGatewayInvoke"
+  statement_id  = var.statement_id
   action        = "lambda:InvokeFunction"
   function_name = var.lambda_name
   principal     = "apigateway.amazonaws.com"
@@ -72,6 +78,10 @@ resource "aws_api_gateway_integration" "options" {
   http_method = aws_api_gateway_method.options.http_method
   type        = "MOCK"
 
+  # With binary_media_types = */* the preflight body would otherwise be
+  # passed through as binary and never match the JSON mapping template
+  content_handling = "CONVERT_TO_TEXT"
+
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -101,7 +111,7 @@ resource "aws_api_gateway_integration_response" "options" {
   status_code = aws_api_gateway_method_response.options.status_code
 
   response_parameters = {
-    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,Authorization'"
+    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,Authorization,If-None-Match'"
     "method.response.header.Access-Control-Allow-Methods" = "'GET,POST,PUT,DELETE,OPTIONS'"
     "method.response.header.Access-Control-Allow-Origin"  = "'*'"
   }
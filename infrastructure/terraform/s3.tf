@@ -39,13 +39,25 @@ resource "aws_s3_bucket_server_side_encryption_configuration" "emails" {
 resource "aws_s3_bucket_lifecycle_configuration" "emails" {
   bucket = aws_s3_bucket.emails.id
 
+  # Raw inbound MIME is only needed until it has been ingested
   rule {
-    id     = "delete-old-emails"
+    id     = "delete-old-incoming"
     status = "Enabled"
 
+    filter {
+      prefix = "incoming/"
+    }
+
     expiration {
       days = 90
     }
+  }
+
+  rule {
+    id     = "expire-noncurrent-versions"
+    status = "Enabled"
+
+    filter {}
 
     noncurrent_version_expiration {
       noncurrent_days = 30
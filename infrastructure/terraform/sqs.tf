@@ -0,0 +1,86 @@
+# SQS queue buffering S3 notifications for inbound mail
+resource "aws_sqs_queue" "inbound" {
+  name = "${var.project_name}-inbound"
+
+  # Must exceed the receive-email timeout so in-flight batches aren't redelivered
+  visibility_timeout_seconds = 360
+  message_retention_seconds  = 345600
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.inbound_dlq.arn
+    maxReceiveCount     = 5
+  })
+
+  tags = local.common_tags
+}
+
+# Dead-letter queue for messages that keep failing
+resource "aws_sqs_queue" "inbound_dlq" {
+  name                      = "${var.project_name}-inbound-dlq"
+  message_retention_seconds = 1209600
+
+  tags = local.common_tags
+}
+
+# Stream records trash-expiry gave up on; each message points at the shard
+# range so the expiries can be replayed
+resource "aws_sqs_queue" "trash_expiry_dlq" {
+  name                      = "${var.project_name}-trash-expiry-dlq"
+  message_retention_seconds = 1209600
+
+  tags = local.common_tags
+}
+
+# Allow the email bucket to publish notifications to the queue
+resource "aws_sqs_queue_policy" "inbound" {
+  queue_url = aws_sqs_queue.inbound.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Sid    = "AllowS3Notifications"
+        Effect = "Allow"
+        Principal = {
+          Service = "s3.amazonaws.com"
+        }
+        Action   = "sqs:SendMessage"
+        Resource = aws_sqs_queue.inbound.arn
+        Condition = {
+          ArnEquals = {
+            "aws:SourceArn" = aws_s3_bucket.emails.arn
+          }
+        }
+      }
+    ]
+  })
+}
+
+# S3 Bucket Notification
+resource "aws_s3_bucket_notification" "email_received" {
+  bucket = aws_s3_bucket.emails.id
+
+  queue {
+    queue_arn     = aws_sqs_queue.inbound.arn
+    events        = ["s3:ObjectCreated:*"]
+    filter_prefix = "incoming/"
+  }
+
+  depends_on = [aws_sqs_queue_policy.inbound]
+}
+
+# Outputs
+output "sqs_inbound_queue_url" {
+  value       = aws_sqs_queue.inbound.id
+  description = "Inbound mail SQS queue URL"
+}
+
+output "sqs_inbound_dlq_url" {
+  value       = aws_sqs_queue.inbound_dlq.id
+  description = "Inbound mail dead-letter queue URL"
+}
+
+output "sqs_trash_expiry_dlq_url" {
+  value       = aws_sqs_queue.trash_expiry_dlq.id
+  description = "Trash expiry failed stream records queue URL"
+}
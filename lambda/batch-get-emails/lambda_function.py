@@ -0,0 +1,186 @@
+import json
+import boto3
+import os
+import gzip
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from vmail_common import (
+    build_response, deserialize_item, emit_metrics, get_cors_headers, parse_json_body
+)
+
+# Initialize AWS clients
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+s3 = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
+S3_BUCKET = os.environ.get('S3_BUCKET', 'vmail-emails-bucket')
+MAX_BATCH_SIZE = 100
+MAX_S3_WORKERS = int(os.environ.get('MAX_S3_WORKERS', 16))
+MAX_UNPROCESSED_RETRIES = 5
+# Lambda caps proxy responses at 6 MB; leave room for the envelope, the
+# errors list and JSON escaping of the body string
+RESPONSE_BUDGET_BYTES = int(os.environ.get('RESPONSE_BUDGET_BYTES', 5 * 1024 * 1024))
+
+# Shared across warm invocations; boto3 clients are thread-safe
+s3_executor = ThreadPoolExecutor(max_workers=MAX_S3_WORKERS)
+
+def lambda_handler(event, context):
+    """
+    Lambda function to get up to 100 emails by ID in one request. Emails
+    that don't fit in the response are returned as unprocessedIds for the
+    client to request again.
+    """
+    try:
+        # Extract user info from Cognito authorizer
+        user_id = event['requestContext']['authorizer']['claims']['sub']
+
+        body = parse_json_body(event)
+
+        email_ids = body.get('emailIds')
+        if not isinstance(email_ids, list) or not email_ids or \
+                not all(isinstance(email_id, str) and email_id for email_id in email_ids):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': 'emailIds must be a non-empty list of IDs'})
+            }
+
+        # Keep request order but fetch each ID once
+        email_ids = list(dict.fromkeys(email_ids))
+        if len(email_ids) > MAX_BATCH_SIZE:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': f'At most {MAX_BATCH_SIZE} emailIds per request'})
+            }
+
+        # Resolve metadata in one BatchGetItem, then check ownership per item
+        items, unprocessed = batch_get_metadata(email_ids)
+        owned = []
+        errors = []
+        for email_id in email_ids:
+            email_metadata = items.get(email_id)
+            if email_id in unprocessed:
+                errors.append({'emailId': email_id, 'statusCode': 503, 'message': 'Throttled, retry'})
+            elif email_metadata is None:
+                errors.append({'emailId': email_id, 'statusCode': 404, 'message': 'Email not found'})
+            elif email_metadata.get('userId') != user_id:
+                errors.append({'emailId': email_id, 'statusCode': 403, 'message': 'Access denied'})
+            else:
+                owned.append(email_metadata)
+
+        # Fetch the S3 bodies concurrently; inline bodies need no round trip
+        contents = list(s3_executor.map(load_email_content, owned))
+        emails, unprocessed_ids = fit_response(
+            [format_email(email_metadata, content) for email_metadata, content in zip(owned, contents)],
+            errors
+        )
+
+        inline_hits = sum(1 for email_metadata in owned if email_metadata['inlineContent'] is not None)
+        emit_metrics({
+            'InlineBodyHit': (inline_hits, 'Count'),
+            'BodiesServed': (len(owned), 'Count')
+        }, {})
+
+        return build_response(event, 200, {
+            'emails': emails,
+            'errors': errors,
+            'unprocessedIds': unprocessed_ids
+        })
+
+    except Exception as e:
+        print(f"Error getting emails: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'message': f'Error getting emails: {str(e)}'
+            })
+        }
+
+def batch_get_metadata(email_ids):
+    """
+    Fetch metadata items with BatchGetItem, retrying UnprocessedKeys with
+    jittered exponential backoff. Returns the items by ID and the IDs still
+    unprocessed once retries run out.
+    """
+    items = {}
+    request = {
+        DYNAMODB_TABLE: {
+            'Keys': [{'emailId': {'S': email_id}} for email_id in email_ids]
+        }
+    }
+
+    for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+        response = dynamodb_client.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(DYNAMODB_TABLE, []):
+            # Keep the compressed inline body as raw bytes for load_email_content
+            inline_content = item.pop('inlineContent', {}).get('B')
+            email_metadata = deserialize_item(item)
+            email_metadata['inlineContent'] = inline_content
+            items[email_metadata['emailId']] = email_metadata
+
+        request = response.get('UnprocessedKeys') or {}
+        if not request:
+            return items, set()
+        if attempt < MAX_UNPROCESSED_RETRIES:
+            time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+
+    unprocessed = {key['emailId']['S'] for key in request[DYNAMODB_TABLE]['Keys']}
+    return items, unprocessed
+
+def fit_response(emails, errors):
+    """
+    Keep emails in request order until their serialized size reaches the
+    response budget and return them with the IDs left over. An email too
+    large to fit on its own is reported in errors, so every response makes
+    progress.
+    """
+    fitted = []
+    used = len(json.dumps(errors))
+    for index, email in enumerate(emails):
+        size = len(json.dumps(email).encode('utf-8'))
+        if size > RESPONSE_BUDGET_BYTES:
+            errors.append({'emailId': email['emailId'], 'statusCode': 413,
+                           'message': 'Email too large for a batch, fetch it on its own'})
+            continue
+        if used + size > RESPONSE_BUDGET_BYTES:
+            return fitted, [email['emailId'] for email in emails[index:]]
+        fitted.append(email)
+        used += size
+    return fitted, []
+
+def load_email_content(email_metadata):
+    """
+    Return the full email JSON, from the inline copy when the item has one
+    and from S3 otherwise
+    """
+    inline_content = email_metadata.get('inlineContent')
+    try:
+        if inline_content is not None:
+            return json.loads(gzip.decompress(inline_content).decode('utf-8'))
+        if email_metadata.get('s3Key'):
+            s3_response = s3.get_object(Bucket=S3_BUCKET, Key=email_metadata['s3Key'])
+            return json.loads(s3_response['Body'].read().decode('utf-8'))
+    except Exception as e:
+        print(f"Error loading email {email_metadata.get('emailId')} content: {str(e)}")
+    return {}
+
+def format_email(email_metadata, email_content):
+    """Combine metadata and content into the get-email response shape"""
+    return {
+        'emailId': email_metadata.get('emailId'),
+        'from': email_metadata.get('from'),
+        'to': email_metadata.get('to'),
+        'cc': email_metadata.get('cc', []),
+        'bcc': email_metadata.get('bcc', []),
+        'subject': email_metadata.get('subject'),
+        'body': email_content.get('body', ''),
+        'timestamp': email_metadata.get('timestamp'),
+        'read': email_metadata.get('read', False),
+        'hasAttachments': email_metadata.get('hasAttachments', False),
+        'attachments': email_content.get('attachments', []),
+        'folder': email_metadata.get('folder')
+    }
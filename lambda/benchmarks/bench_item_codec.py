@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: list-emails item decoding.
+
+Compares the previous resource path (TypeDeserializer -> Decimal ->
+DecimalEncoder during json.dumps) with the native-type codec now shared by
+list-emails and get-email, on 50-item and 1000-item pages.
+
+Run from the lambda directory:
+    python benchmarks/bench_item_codec.py
+"""
+import json
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common')
+sys.path.insert(0, COMMON_DIR)
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+
+from boto3.dynamodb.types import TypeDeserializer  # noqa: E402
+from vmail_common import deserialize_item  # noqa: E402
+
+class DecimalEncoder(json.JSONEncoder):
+    """The encoder list-emails used before the native codec"""
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return int(obj) if obj % 1 == 0 else float(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+def make_wire_item(i):
+    """One list-index row as DynamoDB returns it on the wire"""
+    timestamp = f"2025-11-{1 + i % 28:02d}T10:{i % 60:02d}:00"
+    return {
+        'emailId': {'S': f'user-{i:06d}'},
+        'from': {'S': f'sender{i}@example.com'},
+        'to': {'L': [{'S': 'me@example.com'}]},
+        'subject': {'S': f'Subject line number {i}'},
+        'preview': {'S': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit ' * 2},
+        'timestamp': {'S': timestamp},
+        'read': {'BOOL': i % 3 == 0},
+        'starred': {'BOOL': i % 7 == 0},
+        'hasAttachments': {'BOOL': False},
+        'isDraft': {'BOOL': False},
+        'folder': {'S': 'inbox'},
+        'size': {'N': str(1000 + i)},
+        'score': {'N': f'{i}.5'}
+    }
+
+def resource_path(items):
+    deserializer = TypeDeserializer()
+    decoded = [{k: deserializer.deserialize(v) for k, v in item.items()} for item in items]
+    return json.dumps({'emails': decoded}, cls=DecimalEncoder)
+
+def codec_path(items):
+    decoded = [deserialize_item(item) for item in items]
+    return json.dumps({'emails': decoded})
+
+def main():
+    for page_size in (50, 1000):
+        items = [make_wire_item(i) for i in range(page_size)]
+        assert json.loads(resource_path(items)) == json.loads(codec_path(items))
+
+        number = 20000 // page_size
+        results = {}
+        for name, func in (('resource', resource_path), ('codec', codec_path)):
+            best = min(timeit.repeat(lambda: func(items), number=number, repeat=5))
+            results[name] = best / number * 1000
+        print(f"{page_size:>5} items: resource {results['resource']:.3f} ms/page, "
+              f"codec {results['codec']:.3f} ms/page, "
+              f"speedup {results['resource'] / results['codec']:.2f}x")
+
+if __name__ == '__main__':
+    main()
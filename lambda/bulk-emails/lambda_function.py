@@ -0,0 +1,308 @@
+import json
+import boto3
+import os
+import random
+import time
+from datetime import datetime
+from vmail_common import (
+    delete_objects, deserialize_item, get_cors_headers, object_keys_to_delete,
+    parse_json_body, record_mailbox_changes
+)
+
+# Initialize AWS clients
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
+TRASH_RETENTION_DAYS = int(os.environ.get('TRASH_RETENTION_DAYS', 30))
+MAX_BATCH_SIZE = 100
+TRANSACT_CHUNK_SIZE = 100
+MAX_UNPROCESSED_RETRIES = 5
+MAX_TRANSACT_ATTEMPTS = 3
+
+ACTIONS = ('read', 'unread', 'star', 'unstar', 'move', 'trash', 'delete')
+FOLDERS = ('inbox', 'sent', 'drafts', 'trash')
+
+def lambda_handler(event, context):
+    """
+    Lambda function to apply one action to up to 100 emails at once
+    """
+    try:
+        # Extract user info from Cognito authorizer
+        user_id = event['requestContext']['authorizer']['claims']['sub']
+
+        body = parse_json_body(event)
+
+        action = body.get('action')
+        target_folder = body.get('folder')
+        email_ids = body.get('emailIds')
+
+        if action not in ACTIONS:
+            return error_response(400, f"action must be one of: {', '.join(ACTIONS)}")
+        if action == 'move' and target_folder not in FOLDERS:
+            return error_response(400, f"folder must be one of: {', '.join(FOLDERS)}")
+        if not isinstance(email_ids, list) or not email_ids or \
+                not all(isinstance(email_id, str) and email_id for email_id in email_ids):
+            return error_response(400, 'emailIds must be a non-empty list of IDs')
+
+        # Keep request order but act on each ID once
+        email_ids = list(dict.fromkeys(email_ids))
+        if len(email_ids) > MAX_BATCH_SIZE:
+            return error_response(400, f'At most {MAX_BATCH_SIZE} emailIds per request')
+
+        if action == 'trash':
+            action, target_folder = 'move', 'trash'
+
+        # Read current state in one BatchGetItem; it decides ownership, the
+        # write to make and the counter deltas
+        items, unprocessed = batch_get_metadata(email_ids)
+
+        results = {}
+        changes = {}
+        for email_id in email_ids:
+            if email_id in unprocessed:
+                results[email_id] = result(email_id, 503, 'Temporarily unavailable, please retry')
+            elif email_id not in items:
+                results[email_id] = result(email_id, 404, 'Email not found')
+            elif items[email_id].get('userId') != user_id:
+                results[email_id] = result(email_id, 403, 'Access denied')
+            elif action == 'star' and items[email_id].get('folder') == 'trash':
+                results[email_id] = result(email_id, 409, 'Trashed emails cannot be starred')
+            else:
+                change = plan_change(action, items[email_id], user_id, target_folder)
+                if change:
+                    changes[email_id] = change
+                else:
+                    # Already in the requested state
+                    results[email_id] = result(email_id, 200)
+
+        applied = apply_changes(changes, results)
+
+        # Shared bodies are released, and S3 objects removed, only for
+        # emails whose delete actually committed
+        s3_keys = []
+        for email_id in applied:
+            if changes[email_id]['op'] == 'delete':
+                s3_keys.extend(object_keys_to_delete(items[email_id], user_id))
+        delete_objects(s3_keys)
+
+        record_mailbox_changes(user_id, [changes[email_id] for email_id in applied])
+
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'action': body.get('action'),
+                'results': [results[email_id] for email_id in email_ids]
+            })
+        }
+
+    except Exception as e:
+        print(f"Error applying bulk action: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'message': f'Error applying bulk action: {str(e)}'
+            })
+        }
+
+def plan_change(action, item, user_id, target_folder=None):
+    """
+    Build the conditional transaction entry, counter deltas and change-log
+    entry for one email, or None when it is already in the requested state.
+    Every write is conditioned on the state it was planned from, so the
+    counters stay exact if the email changes in between.
+    """
+    email_id = item['emailId']
+    folder = item.get('folder')
+    unread = 0 if item.get('read', False) else 1
+    starred = 'starredAt' in item
+    key = {'emailId': {'S': email_id}}
+    values = {':sub': {'S': user_id}, ':oldFolder': {'S': folder or ''}}
+    condition = 'userId = :sub AND folder = :oldFolder'
+
+    if action in ('read', 'unread'):
+        read = action == 'read'
+        if item.get('read', False) == read:
+            return None
+        values[':read'] = {'BOOL': read}
+        values[':oldRead'] = {'BOOL': not read}
+        if read:
+            expression = 'SET #read = :read REMOVE unreadKey'
+        else:
+            # Items without folderSortKey aren't in the folder indexes anyway
+            expression = 'SET #read = :read, unreadKey = if_not_exists(folderSortKey, :unreadKey)'
+            values[':unreadKey'] = {'S': email_id}
+        entry = {'Update': {
+            'UpdateExpression': expression,
+            'ConditionExpression': condition + ' AND #read = :oldRead',
+            'ExpressionAttributeNames': {'#read': 'read'}
+        }}
+        counters = {f'{folder}Unread': -1 if read else 1}
+        fields = {'read': read}
+        op = 'update'
+
+    elif action in ('star', 'unstar'):
+        star = action == 'star'
+        if starred == star:
+            return None
+        values[':starred'] = {'BOOL': star}
+        if star:
+            # Trashed mail stays out of the Starred listing
+            values[':starredAt'] = {'S': datetime.now().isoformat()}
+            values[':trash'] = {'S': 'trash'}
+            expression = 'SET starred = :starred, starredAt = :starredAt'
+            condition += ' AND folder <> :trash AND attribute_not_exists(starredAt)'
+        else:
+            expression = 'SET starred = :starred REMOVE starredAt'
+            condition += ' AND attribute_exists(starredAt)'
+        entry = {'Update': {'UpdateExpression': expression, 'ConditionExpression': condition}}
+        counters = {'starredTotal': 1 if star else -1}
+        fields = {'starred': star}
+        op = 'update'
+
+    elif action == 'move':
+        if folder == target_folder:
+            return None
+        values[':folder'] = {'S': target_folder}
+        values[':userFolder'] = {'S': f"{user_id}#{target_folder}"}
+        expression = 'SET folder = :folder, userFolder = :userFolder'
+        # Trashed mail expires through the table TTL and drops out of the
+        # Starred listing; restoring it cancels the expiry
+        removes = []
+        unstar = target_folder == 'trash' and starred
+        fields = {'folder': target_folder}
+        if target_folder == 'trash':
+            expires_at = int(time.time()) + TRASH_RETENTION_DAYS * 24 * 3600
+            values[':expiresAt'] = {'N': str(expires_at)}
+            values[':starred'] = {'BOOL': False}
+            expression += ', expiresAt = :expiresAt, starred = :starred'
+            if item.get('starred', False):
+                fields['starred'] = False
+        elif folder == 'trash':
+            removes.append('expiresAt')
+        if unstar:
+            removes.append('starredAt')
+        if removes:
+            expression += ' REMOVE ' + ', '.join(removes)
+        entry = {'Update': {'UpdateExpression': expression, 'ConditionExpression': condition}}
+        counters = {
+            f'{folder}Total': -1,
+            f'{folder}Unread': -unread,
+            f'{target_folder}Total': 1,
+            f'{target_folder}Unread': unread,
+            'starredTotal': -1 if unstar else 0
+        }
+        op = 'update'
+
+    else:
+        # Permanent delete
+        entry = {'Delete': {'ConditionExpression': condition}}
+        counters = {
+            f'{folder}Total': -1,
+            f'{folder}Unread': -unread,
+            'starredTotal': -1 if starred else 0
+        }
+        fields = {}
+        op = 'delete'
+
+    (kind, spec), = entry.items()
+    spec.update({
+        'TableName': DYNAMODB_TABLE,
+        'Key': key,
+        'ExpressionAttributeValues': values,
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    })
+    return {'entry': entry, 'counters': counters, 'fields': fields, 'op': op, 'emailId': email_id}
+
+def apply_changes(changes, results):
+    """
+    Commit the planned writes with TransactWriteItems in chunks. When a
+    transaction is cancelled, entries whose condition failed are reported
+    as conflicts and the rest of the chunk is retried. Fills in results
+    and returns the IDs whose writes committed.
+    """
+    applied = []
+    pending = list(changes)
+
+    for attempt in range(MAX_TRANSACT_ATTEMPTS):
+        retry = []
+        for start in range(0, len(pending), TRANSACT_CHUNK_SIZE):
+            chunk = pending[start:start + TRANSACT_CHUNK_SIZE]
+            try:
+                dynamodb_client.transact_write_items(
+                    TransactItems=[changes[email_id]['entry'] for email_id in chunk]
+                )
+            except dynamodb_client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get('CancellationReasons', [])
+                for email_id, reason in zip(chunk, reasons):
+                    code = reason.get('Code')
+                    if code == 'ConditionalCheckFailed':
+                        if 'Item' not in reason:
+                            results[email_id] = result(email_id, 404, 'Email not found')
+                        else:
+                            results[email_id] = result(email_id, 409, 'Email changed, please retry')
+                    else:
+                        # Cancelled because of another entry, a conflict or throttling
+                        retry.append(email_id)
+                continue
+
+            for email_id in chunk:
+                results[email_id] = result(email_id, 200)
+            applied.extend(chunk)
+
+        pending = retry
+        if not pending:
+            break
+        if attempt < MAX_TRANSACT_ATTEMPTS - 1:
+            time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+
+    for email_id in pending:
+        results[email_id] = result(email_id, 503, 'Temporarily unavailable, please retry')
+    return applied
+
+def batch_get_metadata(email_ids):
+    """
+    Fetch metadata items with BatchGetItem, retrying UnprocessedKeys with
+    jittered exponential backoff. Returns the items by ID and the IDs still
+    unprocessed once retries run out.
+    """
+    items = {}
+    request = {
+        DYNAMODB_TABLE: {
+            'Keys': [{'emailId': {'S': email_id}} for email_id in email_ids],
+            'ProjectionExpression': 'emailId, userId, folder, #read, starred, starredAt, s3Key, bodyRef, attachments',
+            'ExpressionAttributeNames': {'#read': 'read'}
+        }
+    }
+
+    for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+        response = dynamodb_client.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(DYNAMODB_TABLE, []):
+            email_metadata = deserialize_item(item)
+            items[email_metadata['emailId']] = email_metadata
+
+        request = response.get('UnprocessedKeys') or {}
+        if not request:
+            return items, set()
+        if attempt < MAX_UNPROCESSED_RETRIES:
+            time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+
+    unprocessed = {key['emailId']['S'] for key in request[DYNAMODB_TABLE]['Keys']}
+    return items, unprocessed
+
+def result(email_id, status_code, message=None):
+    """Per-ID outcome returned to the client"""
+    outcome = {'emailId': email_id, 'statusCode': status_code}
+    if message:
+        outcome['message'] = message
+    return outcome
+
+def error_response(status_code, message):
+    """Return a JSON error response"""
+    return {
+        'statusCode': status_code,
+        'headers': get_cors_headers(),
+        'body': json.dumps({'message': message})
+    }
@@ -0,0 +1,36 @@
+import boto3
+import os
+from datetime import datetime
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+USER_EMAILS_TABLE = os.environ.get('USER_EMAILS_TABLE', 'vmail-user-emails')
+
+def lambda_handler(event, context):
+    """
+    Cognito post-confirmation trigger that records the user's email address
+    against their sub, so receive-email can resolve recipients with one GetItem
+    """
+    attributes = event.get('request', {}).get('userAttributes', {})
+    email_address = attributes.get('email', '').strip().lower()
+    user_id = attributes.get('sub')
+
+    if email_address and user_id:
+        try:
+            table = dynamodb.Table(USER_EMAILS_TABLE)
+            table.put_item(
+                Item={
+                    'email': email_address,
+                    'userId': user_id,
+                    'updatedAt': datetime.now().isoformat()
+                }
+            )
+            print(f"Mapped {email_address} to user {user_id}")
+        except Exception as e:
+            # Don't block sign-up; the backfill script repairs missing mappings
+            print(f"Error recording user email mapping: {str(e)}")
+
+    # Cognito triggers must hand the event back
+    return event
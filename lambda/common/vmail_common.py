@@ -0,0 +1,343 @@
+"""
+Helpers shared by the VMail Lambda functions. package-lambdas.sh adds this
+module to every function's zip, so handlers import it as `vmail_common`.
+"""
+import json
+import boto3
+import os
+import base64
+import gzip
+import random
+import time
+from boto3.dynamodb.types import TypeSerializer
+
+# Initialize AWS clients; low-level clients are safe to share across threads
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+s3 = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+MAILBOX_TABLE = os.environ.get('MAILBOX_TABLE', 'vmail-mailbox')
+BODIES_TABLE = os.environ.get('BODIES_TABLE', 'vmail-bodies')
+CHANGE_LOG_TTL_SECONDS = int(os.environ.get('CHANGE_LOG_TTL_SECONDS', 7 * 24 * 3600))
+S3_BUCKET = os.environ.get('S3_BUCKET', 'vmail-emails-bucket')
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+METRICS_NAMESPACE = 'VMail'
+MAX_UNPROCESSED_RETRIES = 5
+
+serializer = TypeSerializer()
+
+def get_cors_headers():
+    """Return CORS headers"""
+    return {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,If-None-Match',
+        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+
+def parse_json_body(event):
+    """Decode the request's JSON body; API Gateway may pass it base64 encoded"""
+    raw_body = event.get('body') or '{}'
+    if event.get('isBase64Encoded'):
+        raw_body = base64.b64decode(raw_body).decode('utf-8')
+    return json.loads(raw_body)
+
+def deserialize_value(value):
+    """Convert one DynamoDB wire-format value to a plain JSON-ready Python value"""
+    (type_code, data), = value.items()
+    if type_code == 'S' or type_code == 'BOOL':
+        return data
+    if type_code == 'N':
+        return deserialize_number(data)
+    if type_code == 'M':
+        return {key: deserialize_value(item) for key, item in data.items()}
+    if type_code == 'L':
+        return [deserialize_value(item) for item in data]
+    if type_code == 'NULL':
+        return None
+    if type_code == 'SS':
+        return list(data)
+    if type_code == 'NS':
+        return [deserialize_number(item) for item in data]
+    if type_code == 'B':
+        return base64.b64encode(data).decode('ascii')
+    if type_code == 'BS':
+        return [base64.b64encode(item).decode('ascii') for item in data]
+    raise TypeError(f'Unsupported DynamoDB type: {type_code}')
+
+def deserialize_number(data):
+    """DynamoDB numbers are strings on the wire; keep integers exact"""
+    if '.' in data or 'e' in data or 'E' in data:
+        return float(data)
+    return int(data)
+
+def deserialize_item(item):
+    """Convert a DynamoDB wire-format item to a plain dict"""
+    return {key: deserialize_value(value) for key, value in item.items()}
+
+def build_response(event, status_code, payload, headers=None):
+    """
+    Serialize a JSON response, gzip-compressing it when the client accepts
+    gzip and the body is large enough to be worth it
+    """
+    headers = {**get_cors_headers(), **(headers or {})}
+    body = json.dumps(payload)
+    raw = body.encode('utf-8')
+
+    encoding = choose_encoding(event.get('headers')) if len(raw) >= COMPRESSION_MIN_BYTES else None
+    if not encoding:
+        return {'statusCode': status_code, 'headers': headers, 'body': body}
+
+    compressed = gzip.compress(raw, compresslevel=6)
+
+    emit_metrics({
+        'ResponseBytes': (len(raw), 'Bytes'),
+        'CompressedBytes': (len(compressed), 'Bytes'),
+        'CompressionRatio': (round(len(raw) / max(len(compressed), 1), 2), 'None')
+    }, {'Encoding': encoding})
+
+    headers.update({'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'})
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+def choose_encoding(headers):
+    """
+    Return 'gzip' when Accept-Encoding allows it, otherwise None. A coding
+    listed with q=0 is refused, not accepted.
+    """
+    accepted = ''
+    for name, value in (headers or {}).items():
+        if name.lower() == 'accept-encoding' and value:
+            accepted = value.lower()
+    codings = set()
+    for entry in accepted.split(','):
+        coding, *params = [part.strip() for part in entry.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            codings.add(coding)
+    if 'gzip' in codings:
+        return 'gzip'
+    return None
+
+def emit_metrics(metrics, dimensions):
+    """Log metrics in CloudWatch embedded metric format"""
+    dimensions = {'Function': os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'), **dimensions}
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()]
+            }]
+        },
+        **dimensions,
+        **{name: value for name, (value, _) in metrics.items()}
+    }))
+
+def record_mailbox_change(user_id, op, email_id, fields=None, counters=None):
+    """
+    Bump the user's mailbox version, apply counter deltas and append the
+    change to the mailbox change log read by GET /emails/changes
+    """
+    record_mailbox_changes(user_id, [{
+        'op': op,
+        'emailId': email_id,
+        'fields': fields or {},
+        'counters': counters or {}
+    }])
+
+def record_mailbox_changes(user_id, changes):
+    """
+    Apply the summed counter deltas and reserve one mailbox version per
+    change in a single update, then append the change-log entries
+    """
+    if not changes:
+        return
+
+    totals = {}
+    for change in changes:
+        for name, delta in change['counters'].items():
+            totals[name] = totals.get(name, 0) + delta
+
+    try:
+        version = update_summary(user_id, len(changes), totals)
+        first_version = version - len(changes) + 1
+
+        expires_at = str(int(time.time()) + CHANGE_LOG_TTL_SECONDS)
+        entries = [
+            {
+                'userId': {'S': user_id},
+                'recordKey': {'S': f"change#{first_version + offset:012d}"},
+                'version': {'N': str(first_version + offset)},
+                'op': {'S': change['op']},
+                'emailId': {'S': change['emailId']},
+                'fields': serializer.serialize(change['fields']),
+                'expiresAt': {'N': expires_at}
+            }
+            for offset, change in enumerate(changes)
+        ]
+        if len(entries) == 1:
+            dynamodb_client.put_item(TableName=MAILBOX_TABLE, Item=entries[0])
+        else:
+            batch_put(MAILBOX_TABLE, entries)
+    except Exception as e:
+        print(f"Error recording mailbox change: {str(e)}")
+
+def record_folder_change(user_id, counters):
+    """
+    Apply a folder-wide operation's counter deltas and bump the mailbox
+    version without a change-log entry. GET /emails/changes treats the
+    resulting gap as a signal to reload, which is cheaper than logging
+    every email.
+    """
+    if not any(counters.values()):
+        return
+    try:
+        update_summary(user_id, 1, counters)
+    except Exception as e:
+        print(f"Error recording mailbox change: {str(e)}")
+
+def update_summary(user_id, versions, counters):
+    """
+    ADD to the version and counters on the summary item and stamp when it
+    changed (epoch milliseconds); returns the new version
+    """
+    response = dynamodb_client.update_item(ReturnValues='UPDATED_NEW', **summary_update(user_id, versions, counters))
+    return int(response['Attributes']['version']['N'])
+
+def summary_update(user_id, versions, counters):
+    """UpdateItem parameters for update_summary, also usable in a transaction"""
+    counters = {name: delta for name, delta in counters.items() if delta}
+    names = {'#version': 'version'}
+    values = {':count': {'N': str(versions)}, ':now': {'N': str(int(time.time() * 1000))}}
+    clauses = ['#version :count']
+    for i, (name, delta) in enumerate(counters.items()):
+        names[f'#c{i}'] = name
+        values[f':c{i}'] = {'N': str(delta)}
+        clauses.append(f'#c{i} :c{i}')
+
+    return {
+        'TableName': MAILBOX_TABLE,
+        'Key': {'userId': {'S': user_id}, 'recordKey': {'S': 'summary'}},
+        'UpdateExpression': 'SET updatedAt = :now ADD ' + ', '.join(clauses),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+
+def batch_put(table_name, items):
+    """
+    Write wire-format items 25 at a time with BatchWriteItem, retrying
+    UnprocessedItems with jittered backoff. Raises if any are left over.
+    """
+    for start in range(0, len(items), 25):
+        request = {table_name: [{'PutRequest': {'Item': item}} for item in items[start:start + 25]]}
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            response = dynamodb_client.batch_write_item(RequestItems=request)
+            request = response.get('UnprocessedItems') or {}
+            if not request:
+                break
+            if attempt < MAX_UNPROCESSED_RETRIES:
+                time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+        if request:
+            raise RuntimeError(f"{len(request[table_name])} items left unprocessed in {table_name}")
+
+def object_keys_to_delete(email_metadata, user_id):
+    """
+    S3 keys to remove for a permanently deleted email. Received bodies and
+    attachments are shared by every recipient and only go once the last
+    reference is released; the user's own mail is deleted outright.
+    """
+    if email_metadata.get('bodyRef'):
+        return release_body(email_metadata['bodyRef'], email_metadata['emailId'])
+    return own_object_keys(email_metadata, user_id)
+
+def own_object_keys(email_metadata, user_id):
+    """
+    S3 keys that belong to this email alone. Shared inbound bodies and
+    attachments are left to the reference count.
+    """
+    if email_metadata.get('bodyRef'):
+        return []
+    keys = [email_metadata.get('s3Key')] + \
+        [attachment.get('key') for attachment in email_metadata.get('attachments', [])
+         if attachment.get('key', '').startswith(f"attachments/{user_id}/")]
+    return [key for key in keys if key]
+
+def release_body(body_ref, email_id):
+    """
+    Drop an email's reference on a shared body. References are the set of
+    email IDs holding the body, so releasing the same email twice is a
+    no-op. Returns the S3 keys to delete when that was the last reference,
+    otherwise an empty list.
+    """
+    conflict = dynamodb_client.exceptions.ConditionalCheckFailedException
+    try:
+        response = dynamodb_client.update_item(
+            TableName=BODIES_TABLE,
+            Key={'bodyRef': {'S': body_ref}},
+            UpdateExpression='DELETE refs :ids',
+            ConditionExpression='contains(refs, :id)',
+            ExpressionAttributeValues={':ids': {'SS': [email_id]}, ':id': {'S': email_id}},
+            ReturnValues='ALL_NEW'
+        )
+    except conflict:
+        # Already released, or the body is gone
+        return []
+
+    # DynamoDB drops a set attribute once its last element is deleted
+    body = deserialize_item(response['Attributes'])
+    if body.get('refs'):
+        return []
+
+    try:
+        # A new delivery may have taken a reference in the meantime
+        dynamodb_client.delete_item(
+            TableName=BODIES_TABLE,
+            Key={'bodyRef': {'S': body_ref}},
+            ConditionExpression='attribute_not_exists(refs)'
+        )
+    except conflict:
+        return []
+    return list(body.get('objectKeys', []))
+
+def delete_objects(keys):
+    """Delete S3 objects with DeleteObjects, 1000 keys per call"""
+    for start in range(0, len(keys), 1000):
+        chunk = keys[start:start + 1000]
+        try:
+            response = s3.delete_objects(
+                Bucket=S3_BUCKET,
+                Delete={'Objects': [{'Key': key} for key in chunk], 'Quiet': True}
+            )
+            for error in response.get('Errors', []):
+                print(f"Error deleting {error.get('Key')} from S3: {error.get('Message')}")
+        except Exception as e:
+            print(f"Error deleting from S3: {str(e)}")
+
+def ownership_failure_response(error):
+    """
+    Map a failed userId condition to a response. The old item only comes
+    back when the email exists, so its absence means 404.
+    """
+    if 'Item' in error.response:
+        return {
+            'statusCode': 403,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'message': 'Access denied'})
+        }
+    return {
+        'statusCode': 404,
+        'headers': get_cors_headers(),
+        'body': json.dumps({'message': 'Email not found'})
+    }
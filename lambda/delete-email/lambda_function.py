@@ -1,14 +1,18 @@
 import json
 import boto3
 import os
+import time
+from vmail_common import (
+    delete_objects, get_cors_headers, object_keys_to_delete, ownership_failure_response,
+    record_mailbox_change
+)
 
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
-s3 = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
 
 # Environment variables
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
-S3_BUCKET = os.environ.get('S3_BUCKET', 'vmail-emails-059409992687')
+TRASH_RETENTION_DAYS = int(os.environ.get('TRASH_RETENTION_DAYS', 30))
 
 def lambda_handler(event, context):
     """
@@ -21,53 +25,48 @@ def lambda_handler(event, context):
         # Get email ID from path parameters
         email_id = event['pathParameters']['emailId']
 
-        # Get email metadata from DynamoDB
         table = dynamodb.Table(DYNAMODB_TABLE)
-        response = table.get_item(Key={'emailId': email_id})
+        conflict = dynamodb.meta.client.exceptions.ConditionalCheckFailedException
 
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'message': 'Email not found'})
-            }
-
-        email_metadata = response['Item']
-
-        # Verify user has access to this email
-        if email_metadata.get('userId') != user_id:
-            return {
-                'statusCode': 403,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'message': 'Access denied'})
-            }
-
-        # Check if email is already in trash
-        if email_metadata.get('folder') == 'trash':
-            # Permanently delete
-            # Delete from DynamoDB
-            table.delete_item(Key={'emailId': email_id})
-
-            # Delete from S3
-            s3_key = email_metadata.get('s3Key')
-            if s3_key:
-                try:
-                    s3.delete_object(Bucket=S3_BUCKET, Key=s3_key)
-                except Exception as e:
-                    print(f"Error deleting from S3: {str(e)}")
-
-            return {
-                'statusCode': 200,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'message': 'Email permanently deleted'})
-            }
-        else:
-            # Move to trash
-            table.update_item(
+        # Move to trash unless it's already there, checking ownership in the
+        # same write; trashed mail drops out of the Starred listing and
+        # expires through the table TTL once the retention period is up
+        try:
+            response = table.update_item(
                 Key={'emailId': email_id},
-                UpdateExpression='SET folder = :folder',
-                ExpressionAttributeValues={':folder': 'trash'}
+                UpdateExpression='SET folder = :folder, userFolder = :userFolder, expiresAt = :expiresAt, '
+                                 'starred = :starred REMOVE starredAt',
+                ConditionExpression='userId = :sub AND folder <> :folder',
+                ExpressionAttributeValues={
+                    ':folder': 'trash',
+                    ':userFolder': f"{user_id}#trash",
+                    ':expiresAt': int(time.time()) + TRASH_RETENTION_DAYS * 24 * 3600,
+                    ':starred': False,
+                    ':sub': user_id
+                },
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
+        except conflict as e:
+            # Only an owned email that is already in trash falls through to
+            # the permanent delete below
+            old_item = e.response.get('Item')
+            if not old_item or old_item.get('userId', {}).get('S') != user_id:
+                return ownership_failure_response(e)
+        else:
+            email_metadata = response['Attributes']
+            folder = email_metadata.get('folder')
+            unread = 0 if email_metadata.get('read', False) else 1
+            fields = {'folder': 'trash'}
+            if email_metadata.get('starred', False):
+                fields['starred'] = False
+            record_mailbox_change(user_id, 'update', email_id, fields, counters={
+                f'{folder}Total': -1,
+                f'{folder}Unread': -unread,
+                'trashTotal': 1,
+                'trashUnread': unread,
+                'starredTotal': -1 if 'starredAt' in email_metadata else 0
+            })
 
             return {
                 'statusCode': 200,
@@ -75,6 +74,44 @@ def lambda_handler(event, context):
                 'body': json.dumps({'message': 'Email moved to trash'})
             }
 
+        # Permanently delete; the folder condition guards against a restore
+        # landing between the two writes
+        try:
+            response = table.delete_item(
+                Key={'emailId': email_id},
+                ConditionExpression='userId = :sub AND folder = :folder',
+                ExpressionAttributeValues={':sub': user_id, ':folder': 'trash'},
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except conflict as e:
+            old_item = e.response.get('Item')
+            if old_item and old_item.get('userId', {}).get('S') == user_id:
+                return {
+                    'statusCode': 409,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'message': 'Email was moved, please retry'})
+                }
+            return ownership_failure_response(e)
+
+        email_metadata = response['Attributes']
+
+        # Received bodies and attachments are shared by every recipient
+        # and only go once the last reference is released; the body and
+        # attachments of the user's own mail are deleted outright
+        delete_objects(object_keys_to_delete(email_metadata, user_id))
+
+        record_mailbox_change(user_id, 'delete', email_id, counters={
+            'trashTotal': -1,
+            'trashUnread': 0 if email_metadata.get('read', False) else -1
+        })
+
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({'message': 'Email permanently deleted'})
+        }
+
     except Exception as e:
         print(f"Error deleting email: {str(e)}")
         return {
@@ -84,11 +121,3 @@ def lambda_handler(event, context):
                 'message': f'Error deleting email: {str(e)}'
             })
         }
-
-def get_cors_headers():
-    """Return CORS headers"""
-    return {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE'
-    }
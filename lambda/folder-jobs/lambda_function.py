@@ -0,0 +1,421 @@
+import json
+import boto3
+import os
+import random
+import time
+import uuid
+from datetime import datetime
+from boto3.dynamodb.conditions import Key
+from vmail_common import (
+    delete_objects, deserialize_item, get_cors_headers, object_keys_to_delete, parse_json_body,
+    record_folder_change
+)
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+lambda_client = boto3.client('lambda', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
+MAILBOX_TABLE = os.environ.get('MAILBOX_TABLE', 'vmail-mailbox')
+FOLDER_INDEX = os.environ.get('FOLDER_INDEX', 'userFolder-folderSortKey-index')
+UNREAD_INDEX = os.environ.get('UNREAD_INDEX', 'userFolder-unreadKey-index')
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 7 * 24 * 3600))
+
+# Each segment reads one index page and writes it in transaction chunks
+PAGE_SIZE = 100
+TRANSACT_CHUNK_SIZE = 25
+# Leave room to save the cursor and hand off before the Lambda times out
+HANDOFF_MARGIN_MS = 30000
+MAX_BACKOFF_SECONDS = 5.0
+# A segment that is still throttled after this many attempts fails the job
+# rather than retrying until the Lambda times out
+MAX_UNPROCESSED_RETRIES = 5
+MAX_TRANSACT_ATTEMPTS = 5
+
+ACTIONS = ('markAllRead', 'emptyTrash')
+FOLDERS = ('inbox', 'sent', 'drafts', 'trash')
+THROTTLING_CODES = ('ThrottlingError', 'ProvisionedThroughputExceeded', 'RequestLimitExceeded',
+                    'ThrottlingException', 'ProvisionedThroughputExceededException')
+
+class SegmentInterrupted(Exception):
+    """
+    A segment stopped before finishing its page, because time ran low or
+    DynamoDB kept throttling. Carries how many emails it did apply; the job
+    resumes from the start of the page, whose applied emails have already
+    left it.
+    """
+    def __init__(self, message, timed_out=False):
+        super().__init__(message)
+        self.timed_out = timed_out
+        self.processed = 0
+
+def lambda_handler(event, context):
+    """
+    Lambda function for folder-wide operations (mark all read, empty trash).
+    API requests start a job or report its status; the job itself runs in
+    asynchronous self-invocations that each process segments of the folder
+    until their time runs low, then hand the cursor to the next invocation.
+    """
+    if 'jobId' in event and 'requestContext' not in event:
+        return run_job(event['userId'], event['jobId'], context)
+
+    try:
+        # Extract user info from Cognito authorizer
+        user_id = event['requestContext']['authorizer']['claims']['sub']
+
+        if event.get('httpMethod') == 'GET':
+            return get_job(user_id, event['pathParameters']['jobId'])
+        return start_job(user_id, event, context)
+
+    except Exception as e:
+        print(f"Error handling folder job request: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'message': f'Error handling folder job request: {str(e)}'
+            })
+        }
+
+def start_job(user_id, event, context):
+    """Validate the request, record the job and kick off the first worker"""
+    body = parse_json_body(event)
+
+    action = body.get('action')
+    if action not in ACTIONS:
+        return error_response(400, f"action must be one of: {', '.join(ACTIONS)}")
+    folder = 'trash' if action == 'emptyTrash' else body.get('folder', 'inbox')
+    if folder not in FOLDERS:
+        return error_response(400, f"folder must be one of: {', '.join(FOLDERS)}")
+
+    job_id = str(uuid.uuid4())
+    now = datetime.now().isoformat()
+    job = {
+        'userId': user_id,
+        'recordKey': f"job#{job_id}",
+        'jobId': job_id,
+        'action': action,
+        'folder': folder,
+        'status': 'pending',
+        'processed': 0,
+        'createdAt': now,
+        'updatedAt': now,
+        'expiresAt': int(time.time()) + JOB_TTL_SECONDS
+    }
+    dynamodb.Table(MAILBOX_TABLE).put_item(Item=job)
+    hand_off(context, user_id, job_id)
+
+    return {
+        'statusCode': 202,
+        'headers': get_cors_headers(),
+        'body': json.dumps(format_job(job))
+    }
+
+def get_job(user_id, job_id):
+    """Return a job's status; jobs are keyed under their owner"""
+    response = dynamodb_client.get_item(
+        TableName=MAILBOX_TABLE,
+        Key={'userId': {'S': user_id}, 'recordKey': {'S': f"job#{job_id}"}}
+    )
+    if 'Item' not in response:
+        return error_response(404, 'Job not found')
+
+    return {
+        'statusCode': 200,
+        'headers': get_cors_headers(),
+        'body': json.dumps(format_job(deserialize_item(response['Item'])))
+    }
+
+def hand_off(context, user_id, job_id):
+    """Continue the job in a fresh asynchronous invocation of this function"""
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps({'userId': user_id, 'jobId': job_id})
+    )
+
+def run_job(user_id, job_id, context):
+    """
+    Process folder segments until the invocation's time runs low, saving
+    the cursor after every segment so a retry or hand-off resumes there
+    """
+    table = dynamodb.Table(MAILBOX_TABLE)
+    job_key = {'userId': user_id, 'recordKey': f"job#{job_id}"}
+    job = table.get_item(Key=job_key, ConsistentRead=True).get('Item')
+    if not job or job['status'] in ('completed', 'failed'):
+        return
+
+    cursor = job.get('cursor')
+    processed = int(job.get('processed', 0))
+    throttle = Throttle(context)
+
+    try:
+        while True:
+            try:
+                if job['action'] == 'markAllRead':
+                    count, cursor = mark_read_segment(user_id, job['folder'], cursor, throttle)
+                else:
+                    count, cursor = empty_trash_segment(user_id, cursor, throttle)
+            except SegmentInterrupted as e:
+                # The cursor still points at the start of the interrupted page
+                processed += e.processed
+                if not e.timed_out:
+                    raise
+                update_job(job_key, 'running', processed, cursor)
+                hand_off(context, user_id, job_id)
+                return
+            processed += count
+
+            done = cursor is None
+            update_job(job_key, 'completed' if done else 'running', processed, cursor)
+            if done:
+                print(f"Job {job_id} completed: {processed} emails")
+                return
+            if context.get_remaining_time_in_millis() < HANDOFF_MARGIN_MS:
+                hand_off(context, user_id, job_id)
+                return
+
+    except Exception as e:
+        print(f"Error running job {job_id}: {str(e)}")
+        update_job(job_key, 'failed', processed, cursor, error=str(e))
+
+def update_job(job_key, status, processed, cursor, error=None):
+    """Save job progress and the cursor to resume from"""
+    names = {'#status': 'status', '#cursor': 'cursor'}
+    values = {
+        ':status': status,
+        ':processed': processed,
+        ':updatedAt': datetime.now().isoformat(),
+        ':expiresAt': int(time.time()) + JOB_TTL_SECONDS
+    }
+    clauses = ['#status = :status', 'processed = :processed', 'updatedAt = :updatedAt', 'expiresAt = :expiresAt']
+    if cursor is not None:
+        clauses.append('#cursor = :cursor')
+        values[':cursor'] = cursor
+    if error:
+        clauses.append('#error = :error')
+        names['#error'] = 'error'
+        values[':error'] = error
+
+    expression = 'SET ' + ', '.join(clauses)
+    if cursor is None:
+        expression += ' REMOVE #cursor'
+
+    dynamodb.Table(MAILBOX_TABLE).update_item(
+        Key=job_key,
+        UpdateExpression=expression,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+def mark_read_segment(user_id, folder, cursor, throttle):
+    """
+    Mark one page of the folder's unread index as read. Items leave the
+    sparse index as they are updated, so the cursor only ever moves forward.
+    """
+    page, cursor = query_page(UNREAD_INDEX, f"{user_id}#{folder}", cursor, throttle)
+
+    entries = {
+        item['emailId']: {'Update': {
+            'TableName': DYNAMODB_TABLE,
+            'Key': {'emailId': {'S': item['emailId']}},
+            'UpdateExpression': 'SET #read = :read REMOVE unreadKey',
+            'ConditionExpression': 'userId = :sub AND folder = :folder AND #read = :unread',
+            'ExpressionAttributeNames': {'#read': 'read'},
+            'ExpressionAttributeValues': {
+                ':read': {'BOOL': True},
+                ':unread': {'BOOL': False},
+                ':sub': {'S': user_id},
+                ':folder': {'S': folder}
+            }
+        }}
+        for item in page
+    }
+    applied, interrupted = transact_in_chunks(entries, throttle)
+
+    record_folder_change(user_id, {f'{folder}Unread': -len(applied)})
+    if interrupted:
+        interrupted.processed = len(applied)
+        raise interrupted
+    return len(applied), cursor
+
+def empty_trash_segment(user_id, cursor, throttle):
+    """
+    Permanently delete one page of the trash folder, then release shared
+    bodies and delete the S3 objects of what was removed
+    """
+    page, cursor = query_page(FOLDER_INDEX, f"{user_id}#trash", cursor, throttle)
+    # The folder index only projects list fields; storage keys live on the item
+    items = batch_get_storage(user_id, [item['emailId'] for item in page], throttle)
+
+    entries = {
+        email_id: {'Delete': {
+            'TableName': DYNAMODB_TABLE,
+            'Key': {'emailId': {'S': email_id}},
+            'ConditionExpression': 'userId = :sub AND folder = :folder',
+            'ExpressionAttributeValues': {
+                ':sub': {'S': user_id},
+                ':folder': {'S': 'trash'}
+            }
+        }}
+        for email_id in items
+    }
+    applied, interrupted = transact_in_chunks(entries, throttle)
+
+    s3_keys = []
+    for email_id in applied:
+        s3_keys.extend(object_keys_to_delete(items[email_id], user_id))
+    delete_objects(s3_keys)
+
+    unread = sum(1 for email_id in applied if not items[email_id].get('read', False))
+    record_folder_change(user_id, {'trashTotal': -len(applied), 'trashUnread': -unread})
+    if interrupted:
+        interrupted.processed = len(applied)
+        raise interrupted
+    return len(applied), cursor
+
+def query_page(index_name, user_folder, cursor, throttle):
+    """Read one page of a folder index, returning its items and the next cursor"""
+    kwargs = {
+        'IndexName': index_name,
+        'KeyConditionExpression': Key('userFolder').eq(user_folder),
+        'ProjectionExpression': 'emailId',
+        'Limit': PAGE_SIZE
+    }
+    if cursor:
+        kwargs['ExclusiveStartKey'] = cursor
+
+    table = dynamodb.Table(DYNAMODB_TABLE)
+    for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+        throttle.check_time()
+        try:
+            response = table.query(**kwargs)
+            throttle.success()
+            return response.get('Items', []), response.get('LastEvaluatedKey')
+        except dynamodb.meta.client.exceptions.ProvisionedThroughputExceededException:
+            throttle.wait()
+    raise SegmentInterrupted(f"{index_name} query still throttled after {MAX_UNPROCESSED_RETRIES + 1} attempts")
+
+def batch_get_storage(user_id, email_ids, throttle):
+    """Fetch the fields needed to delete each email and its stored objects"""
+    items = {}
+    for start in range(0, len(email_ids), 100):
+        request = {
+            DYNAMODB_TABLE: {
+                'Keys': [{'emailId': email_id} for email_id in email_ids[start:start + 100]],
+                'ProjectionExpression': 'emailId, userId, folder, #read, s3Key, bodyRef, attachments',
+                'ExpressionAttributeNames': {'#read': 'read'}
+            }
+        }
+        # Every key must be read; skipping one would leave it behind in trash
+        # once the cursor moves past it, so give up on the page instead
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            throttle.check_time()
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(DYNAMODB_TABLE, []):
+                if item.get('userId') == user_id and item.get('folder') == 'trash':
+                    items[item['emailId']] = item
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+            throttle.wait()
+        if request:
+            raise SegmentInterrupted(
+                f"{len(request[DYNAMODB_TABLE]['Keys'])} trash items left unprocessed "
+                f"after {MAX_UNPROCESSED_RETRIES + 1} attempts"
+            )
+        throttle.success()
+    return items
+
+def transact_in_chunks(entries, throttle):
+    """
+    Commit conditional writes with TransactWriteItems. Entries whose
+    condition fails already changed and are dropped; entries cancelled for
+    any other reason are retried, backing off harder while DynamoDB
+    throttles, for up to MAX_TRANSACT_ATTEMPTS passes. Returns the IDs
+    whose writes committed, and a SegmentInterrupted when time ran low or
+    entries were still pending after the last pass.
+    """
+    applied = []
+    pending = list(entries)
+    for attempt in range(MAX_TRANSACT_ATTEMPTS):
+        retry = []
+        for start in range(0, len(pending), TRANSACT_CHUNK_SIZE):
+            chunk = pending[start:start + TRANSACT_CHUNK_SIZE]
+            if throttle.time_low():
+                return applied, SegmentInterrupted('Time running low', timed_out=True)
+            try:
+                dynamodb_client.transact_write_items(TransactItems=[entries[email_id] for email_id in chunk])
+            except dynamodb_client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get('CancellationReasons', [])
+                retry.extend(email_id for email_id, reason in zip(chunk, reasons)
+                             if reason.get('Code') != 'ConditionalCheckFailed')
+                if any(reason.get('Code') in THROTTLING_CODES for reason in reasons):
+                    throttle.wait()
+                continue
+            except (dynamodb_client.exceptions.ProvisionedThroughputExceededException,
+                    dynamodb_client.exceptions.RequestLimitExceeded):
+                throttle.wait()
+                retry.extend(chunk)
+                continue
+
+            throttle.success()
+            applied.extend(chunk)
+
+        pending = retry
+        if not pending:
+            return applied, None
+
+    return applied, SegmentInterrupted(
+        f"{len(pending)} emails still throttled after {MAX_TRANSACT_ATTEMPTS} attempts"
+    )
+
+class Throttle:
+    """
+    Adaptive backoff shared by a job's calls: each throttle doubles the
+    delay (with jitter) up to a cap, each success halves it again. Also
+    tracks the invocation's remaining time so retry loops stop in time to
+    hand off.
+    """
+    def __init__(self, context):
+        self.context = context
+        self.delay = 0.0
+
+    def time_low(self):
+        return self.context.get_remaining_time_in_millis() < HANDOFF_MARGIN_MS
+
+    def check_time(self):
+        if self.time_low():
+            raise SegmentInterrupted('Time running low', timed_out=True)
+
+    def wait(self):
+        self.delay = min(max(self.delay * 2, 0.05), MAX_BACKOFF_SECONDS)
+        time.sleep(random.uniform(self.delay / 2, self.delay))
+
+    def success(self):
+        self.delay /= 2
+        if self.delay:
+            time.sleep(self.delay)
+
+def format_job(job):
+    """Job status as returned to the client"""
+    return {
+        'jobId': job['jobId'],
+        'action': job['action'],
+        'folder': job['folder'],
+        'status': job['status'],
+        'processed': job.get('processed', 0),
+        'createdAt': job.get('createdAt'),
+        'updatedAt': job.get('updatedAt'),
+        'error': job.get('error')
+    }
+
+def error_response(status_code, message):
+    """Return a JSON error response"""
+    return {
+        'statusCode': status_code,
+        'headers': get_cors_headers(),
+        'body': json.dumps({'message': message})
+    }
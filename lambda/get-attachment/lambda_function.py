@@ -0,0 +1,102 @@
+import json
+import boto3
+import os
+from vmail_common import get_cors_headers
+
+# Initialize AWS clients; presigned URLs are signed offline, so the S3
+# client must be in the bucket's region (the provider region)
+dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+s3 = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
+S3_BUCKET = os.environ.get('S3_BUCKET', 'vmail-emails-bucket')
+DOWNLOAD_URL_TTL_SECONDS = int(os.environ.get('DOWNLOAD_URL_TTL_SECONDS', 300))
+
+def lambda_handler(event, context):
+    """
+    Lambda function to return a presigned download URL for one attachment
+    """
+    try:
+        # Extract user info from Cognito authorizer
+        user_id = event['requestContext']['authorizer']['claims']['sub']
+
+        # Get email ID and attachment index from path parameters
+        email_id = event['pathParameters']['emailId']
+        try:
+            index = int(event['pathParameters']['index'])
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': 'Invalid attachment index'})
+            }
+
+        # The attachment manifest lives on the item, so this is one GetItem
+        table = dynamodb.Table(DYNAMODB_TABLE)
+        response = table.get_item(
+            Key={'emailId': email_id},
+            ProjectionExpression='userId, attachments'
+        )
+
+        if 'Item' not in response:
+            return {
+                'statusCode': 404,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': 'Email not found'})
+            }
+
+        email_metadata = response['Item']
+
+        # Verify user has access to this email
+        if email_metadata.get('userId') != user_id:
+            return {
+                'statusCode': 403,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': 'Access denied'})
+            }
+
+        attachments = email_metadata.get('attachments', [])
+        if index < 0 or index >= len(attachments) or not attachments[index].get('key'):
+            return {
+                'statusCode': 404,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': 'Attachment not found'})
+            }
+
+        # The browser downloads straight from S3; presigned GETs also honour
+        # Range headers for resumable or partial downloads
+        attachment = attachments[index]
+        filename = attachment.get('filename', f'attachment-{index}').replace('"', '')
+        url = s3.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': S3_BUCKET,
+                'Key': attachment['key'],
+                'ResponseContentType': attachment.get('contentType', 'application/octet-stream'),
+                'ResponseContentDisposition': f'attachment; filename="{filename}"'
+            },
+            ExpiresIn=DOWNLOAD_URL_TTL_SECONDS
+        )
+
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'url': url,
+                'filename': attachment.get('filename'),
+                'contentType': attachment.get('contentType'),
+                'size': int(attachment.get('size', 0)),
+                'expiresIn': DOWNLOAD_URL_TTL_SECONDS
+            })
+        }
+
+    except Exception as e:
+        print(f"Error getting attachment: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'message': f'Error getting attachment: {str(e)}'
+            })
+        }
@@ -0,0 +1,54 @@
+import json
+import boto3
+import os
+from decimal import Decimal
+from vmail_common import get_cors_headers
+
+# Initialize AWS clients
+dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+MAILBOX_TABLE = os.environ.get('MAILBOX_TABLE', 'vmail-mailbox')
+
+FOLDERS = ['inbox', 'sent', 'drafts', 'trash']
+
+def lambda_handler(event, context):
+    """
+    Lambda function to return the per-folder sidebar counters
+    """
+    try:
+        # Extract user info from Cognito authorizer
+        user_id = event['requestContext']['authorizer']['claims']['sub']
+
+        # Counters are maintained by the mutating handlers, so this is one GetItem
+        table = dynamodb.Table(MAILBOX_TABLE)
+        response = table.get_item(Key={'userId': user_id, 'recordKey': 'summary'})
+        summary = response.get('Item', {})
+
+        counts = {folder: get_counter(summary, f'{folder}Total') for folder in FOLDERS}
+        counts['starred'] = get_counter(summary, 'starredTotal')
+        unread = {folder: get_counter(summary, f'{folder}Unread') for folder in FOLDERS}
+
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'counts': counts,
+                'unread': unread
+            })
+        }
+
+    except Exception as e:
+        print(f"Error getting email counts: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'message': f'Error getting email counts: {str(e)}'
+            })
+        }
+
+def get_counter(summary, name):
+    """Read a counter as an int, never reporting a negative badge"""
+    value = summary.get(name, Decimal(0))
+    return max(int(value), 0)
@@ -1,26 +1,29 @@
 import json
 import boto3
 import os
-from decimal import Decimal
+import gzip
+import time
+from concurrent.futures import ThreadPoolExecutor
+from vmail_common import (
+    build_response, deserialize_item, emit_metrics, get_cors_headers, record_mailbox_change
+)
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+# Initialize AWS clients; the low-level client skips the resource layer's
+# Decimal-based TypeDeserializer on this hot path
+dynamodb_client = boto3.client('dynamodb', region_name='us-east-1')
 s3 = boto3.client('s3', region_name='ap-south-2')
 
 # Environment variables
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
 S3_BUCKET = os.environ.get('S3_BUCKET', 'vmail-emails-bucket')
 
-class DecimalEncoder(json.JSONEncoder):
-    """Helper class to convert DynamoDB Decimal types to int/float"""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return int(obj) if obj % 1 == 0 else float(obj)
-        return super(DecimalEncoder, self).default(obj)
+# Reused across warm invocations for work that overlaps the body fetch
+executor = ThreadPoolExecutor(max_workers=2)
 
 def lambda_handler(event, context):
     """
-    Lambda function to get a single email by ID
+    Lambda function to get a single email by ID. With ?markRead=true the
+    email is also marked as read, so opening a message takes one request.
     """
     try:
         # Extract user info from Cognito authorizer
@@ -29,20 +32,29 @@ def lambda_handler(event, context):
         # Get email ID from path parameters
         email_id = event['pathParameters']['emailId']
 
-        # Get email metadata from DynamoDB
-        table = dynamodb.Table(DYNAMODB_TABLE)
-        response = table.get_item(
-            Key={'emailId': email_id}
-        )
+        params = event.get('queryStringParameters') or {}
+        mark_read = params.get('markRead', '').lower() == 'true'
+
+        if mark_read:
+            item = mark_email_read(email_id, user_id)
+        else:
+            # Get email metadata from DynamoDB
+            response = dynamodb_client.get_item(
+                TableName=DYNAMODB_TABLE,
+                Key={'emailId': {'S': email_id}}
+            )
+            item = response.get('Item')
 
-        if 'Item' not in response:
+        if item is None:
             return {
                 'statusCode': 404,
                 'headers': get_cors_headers(),
                 'body': json.dumps({'message': 'Email not found'})
             }
 
-        email_metadata = response['Item']
+        # Small bodies are stored gzip-compressed on the item itself
+        inline_content = item.pop('inlineContent', {}).get('B')
+        email_metadata = deserialize_item(item)
 
         # Verify user has access to this email
         if email_metadata.get('userId') != user_id:
@@ -52,17 +64,17 @@ def lambda_handler(event, context):
                 'body': json.dumps({'message': 'Access denied'})
             }
 
-        # Get full email content from S3
-        s3_key = email_metadata.get('s3Key')
-        if s3_key:
-            try:
-                s3_response = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
-                email_content = json.loads(s3_response['Body'].read().decode('utf-8'))
-            except Exception as e:
-                print(f"Error getting email from S3: {str(e)}")
-                email_content = {}
+        if mark_read and not email_metadata.get('read', False):
+            # The item came back as it was before the write; log the change
+            # while the body is fetched
+            folder = email_metadata.get('folder')
+            pending = executor.submit(record_mailbox_change, user_id, 'update', email_id,
+                                      {'read': True}, counters={f'{folder}Unread': -1})
+            email_content = load_email_content(email_metadata, inline_content)
+            pending.result()
+            email_metadata['read'] = True
         else:
-            email_content = {}
+            email_content = load_email_content(email_metadata, inline_content)
 
         # Combine metadata and content
         full_email = {
@@ -80,11 +92,7 @@ def lambda_handler(event, context):
             'folder': email_metadata.get('folder')
         }
 
-        return {
-            'statusCode': 200,
-            'headers': get_cors_headers(),
-            'body': json.dumps(full_email, cls=DecimalEncoder)
-        }
+        return build_response(event, 200, full_email)
 
     except Exception as e:
         print(f"Error getting email: {str(e)}")
@@ -96,10 +104,50 @@ def lambda_handler(event, context):
             })
         }
 
-def get_cors_headers():
-    """Return CORS headers"""
-    return {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE'
-    }
+def mark_email_read(email_id, user_id):
+    """
+    Mark the email as read in one conditional write that also checks
+    ownership. Returns the item as it was before the write in wire format,
+    or None when it doesn't exist; an item owned by someone else comes
+    back unchanged for the caller's access check.
+    """
+    try:
+        response = dynamodb_client.update_item(
+            TableName=DYNAMODB_TABLE,
+            Key={'emailId': {'S': email_id}},
+            UpdateExpression='SET #read = :read REMOVE unreadKey',
+            ConditionExpression='userId = :sub',
+            ExpressionAttributeNames={'#read': 'read'},
+            ExpressionAttributeValues={':read': {'BOOL': True}, ':sub': {'S': user_id}},
+            ReturnValues='ALL_OLD',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException as e:
+        return e.response.get('Item')
+    return response['Attributes']
+
+def load_email_content(email_metadata, inline_content=None):
+    """
+    Return the full email JSON, from the inline copy when the item has one
+    and from S3 otherwise, recording which source served it
+    """
+    started = time.perf_counter()
+    source = 'inline' if inline_content is not None else 's3'
+    email_content = {}
+
+    try:
+        if inline_content is not None:
+            email_content = json.loads(gzip.decompress(inline_content).decode('utf-8'))
+        elif email_metadata.get('s3Key'):
+            s3_response = s3.get_object(Bucket=S3_BUCKET, Key=email_metadata['s3Key'])
+            email_content = json.loads(s3_response['Body'].read().decode('utf-8'))
+        else:
+            return email_content
+    except Exception as e:
+        print(f"Error loading email content from {source}: {str(e)}")
+
+    emit_metrics({
+        'InlineBodyHit': (1 if source == 'inline' else 0, 'Count'),
+        'BodyFetchMs': (round((time.perf_counter() - started) * 1000, 3), 'Milliseconds')
+    }, {'Source': source})
+    return email_content
@@ -0,0 +1,99 @@
+import json
+import boto3
+import os
+from vmail_common import deserialize_item, get_cors_headers
+
+# Initialize AWS clients
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+MAILBOX_TABLE = os.environ.get('MAILBOX_TABLE', 'vmail-mailbox')
+MAX_CHANGES = 200
+
+def lambda_handler(event, context):
+    """
+    Lambda function to return mailbox changes since a client's last version
+    """
+    try:
+        # Extract user info from Cognito authorizer
+        user_id = event['requestContext']['authorizer']['claims']['sub']
+
+        params = event.get('queryStringParameters') or {}
+        try:
+            since = int(params['since']) if params.get('since') else None
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': 'Invalid since version'})
+            }
+
+        response = dynamodb_client.get_item(
+            TableName=MAILBOX_TABLE,
+            Key={'userId': {'S': user_id}, 'recordKey': {'S': 'summary'}},
+            ProjectionExpression='version'
+        )
+        current_version = int(response.get('Item', {}).get('version', {}).get('N', 0))
+
+        # No cursor yet, or a cursor from the future: the client has to reload
+        if since is None or since > current_version:
+            return changes_response(current_version, [], resync=True)
+
+        # Steady state: nothing changed, so skip the log query entirely
+        if since == current_version:
+            return changes_response(current_version, [])
+
+        response = dynamodb_client.query(
+            TableName=MAILBOX_TABLE,
+            KeyConditionExpression='userId = :sub AND recordKey BETWEEN :first AND :last',
+            ExpressionAttributeValues={
+                ':sub': {'S': user_id},
+                ':first': {'S': f"change#{since + 1:012d}"},
+                ':last': {'S': f"change#{current_version:012d}"}
+            },
+            Limit=MAX_CHANGES
+        )
+        changes = []
+        for item in response.get('Items', []):
+            change = deserialize_item(item)
+            changes.append({
+                'version': change['version'],
+                'op': change['op'],
+                'emailId': change['emailId'],
+                'fields': change.get('fields', {})
+            })
+
+        # A gap means the log expired, a writer failed between its two
+        # writes or a folder-wide job skipped the log; deltas can't be
+        # trusted, so ask for a full reload
+        has_more = 'LastEvaluatedKey' in response
+        expected = range(since + 1, since + 1 + len(changes))
+        if [int(change['version']) for change in changes] != list(expected) or \
+                (not has_more and since + len(changes) != current_version):
+            return changes_response(current_version, [], resync=True)
+
+        version = int(changes[-1]['version']) if has_more else current_version
+        return changes_response(version, changes, has_more=has_more)
+
+    except Exception as e:
+        print(f"Error listing changes: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': get_cors_headers(),
+            'body': json.dumps({
+                'message': f'Error listing changes: {str(e)}'
+            })
+        }
+
+def changes_response(version, changes, resync=False, has_more=False):
+    """Build the 200 response for a change-log read"""
+    return {
+        'statusCode': 200,
+        'headers': get_cors_headers(),
+        'body': json.dumps({
+            'version': version,
+            'changes': changes,
+            'hasMore': has_more,
+            'resync': resync
+        })
+    }
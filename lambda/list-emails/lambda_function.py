@@ -1,21 +1,34 @@
 import json
 import boto3
 import os
-from boto3.dynamodb.conditions import Key, Attr
-from decimal import Decimal
+import base64
+import hashlib
+import time
+from vmail_common import build_response, deserialize_item, get_cors_headers
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+# Initialize AWS clients; the low-level client skips the resource layer's
+# Decimal-based TypeDeserializer on this hot path
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
 
 # Environment variables
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
+MAILBOX_TABLE = os.environ.get('MAILBOX_TABLE', 'vmail-mailbox')
+FOLDER_INDEX = os.environ.get('FOLDER_INDEX', 'userFolder-folderSortKey-index')
+STARRED_INDEX = os.environ.get('STARRED_INDEX', 'userId-starredAt-index')
+UNREAD_INDEX = os.environ.get('UNREAD_INDEX', 'userFolder-unreadKey-index')
+MAX_LIMIT = 100
+# How long after a mutation the folder indexes may still lag the table;
+# no ETag is handed out or matched until the mailbox has been quiet this long
+INDEX_SETTLE_MS = int(os.environ.get('INDEX_SETTLE_MS', 2000))
 
-class DecimalEncoder(json.JSONEncoder):
-    """Helper class to convert DynamoDB Decimal types to int/float"""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return int(obj) if obj % 1 == 0 else float(obj)
-        return super(DecimalEncoder, self).default(obj)
+# Attribute sets a client can ask for with fields=; all of them are
+# projected into the list indexes
+FIELD_SETS = {
+    'full': ('emailId', 'from', 'to', 'subject', 'preview', 'timestamp', 'read',
+             'starred', 'hasAttachments', 'isDraft', 'folder'),
+    'compact': ('emailId', 'from', 'subject', 'timestamp', 'read')
+}
+FIELD_DEFAULTS = {'read': False, 'starred': False, 'hasAttachments': False, 'isDraft': False}
 
 def lambda_handler(event, context):
     """
@@ -28,47 +41,75 @@ def lambda_handler(event, context):
         # Get query parameters
         params = event.get('queryStringParameters') or {}
         folder = params.get('folder', 'inbox')
-        limit = int(params.get('limit', 50))
+        list_filter = params.get('filter')
+        fields = FIELD_SETS.get(params.get('fields') or 'full')
+        try:
+            limit = min(max(int(params.get('limit', 50)), 1), MAX_LIMIT)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': f"Invalid limit: {params.get('limit')}"})
+            }
 
-        # Query DynamoDB
-        table = dynamodb.Table(DYNAMODB_TABLE)
+        if list_filter not in (None, '', 'unread') or \
+                (list_filter == 'unread' and folder == 'starred'):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': f'Unsupported filter: {list_filter}'})
+            }
 
-        # Scan table and filter by userId and folder (GSI may not be populated yet)
-        response = table.scan(
-            FilterExpression=Attr('userId').eq(user_id) & Attr('folder').eq(folder),
-            Limit=limit
-        )
+        if fields is None:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': f"Unsupported fields: {params.get('fields')}"})
+            }
 
-        emails = response.get('Items', [])
+        # Any mutation bumps the mailbox version, so an unchanged version
+        # means the client's cached page is still exact, once the index has
+        # had time to catch up with the last write
+        etag = compute_etag(user_id, params)
+        if etag and etag in parse_if_none_match(event.get('headers')):
+            return {
+                'statusCode': 304,
+                'headers': {**get_cors_headers(), 'ETag': etag, 'Cache-Control': 'private, no-cache'},
+                'body': ''
+            }
 
-        # Sort by timestamp descending
-        emails = sorted(emails, key=lambda x: x.get('timestamp', ''), reverse=True)
+        try:
+            start_key = decode_next_token(params.get('nextToken'))
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'message': 'Invalid nextToken'})
+            }
+
+        # Query the user's folder partition, newest first
+        if folder == 'starred':
+            emails, last_key = query_starred(user_id, limit, fields, start_key)
+        else:
+            index_name = UNREAD_INDEX if list_filter == 'unread' else FOLDER_INDEX
+            emails, last_key = query_folder(user_id, folder, limit, fields, start_key,
+                                            index_name=index_name)
 
         # Format emails for frontend
         formatted_emails = []
         for email in emails:
             formatted_emails.append({
-                'emailId': email.get('emailId'),
-                'from': email.get('from'),
-                'to': email.get('to'),
-                'subject': email.get('subject'),
-                'preview': email.get('preview'),
-                'timestamp': email.get('timestamp'),
-                'read': email.get('read', False),
-                'starred': email.get('starred', False),
-                'hasAttachments': email.get('hasAttachments', False),
-                'isDraft': email.get('isDraft', False),
-                'folder': email.get('folder')
+                field: email.get(field, FIELD_DEFAULTS.get(field)) for field in fields
             })
 
-        return {
-            'statusCode': 200,
-            'headers': get_cors_headers(),
-            'body': json.dumps({
-                'emails': formatted_emails,
-                'count': len(formatted_emails)
-            }, cls=DecimalEncoder)
-        }
+        headers = {'Cache-Control': 'private, no-cache'}
+        if etag:
+            headers['ETag'] = etag
+        return build_response(event, 200, {
+            'emails': formatted_emails,
+            'count': len(formatted_emails),
+            'nextToken': encode_next_token(last_key)
+        }, headers=headers)
 
     except Exception as e:
         print(f"Error listing emails: {str(e)}")
@@ -80,10 +121,91 @@ def lambda_handler(event, context):
             })
         }
 
-def get_cors_headers():
-    """Return CORS headers"""
-    return {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE'
+def query_folder(user_id, folder, limit, fields, start_key=None, index_name=FOLDER_INDEX):
+    """
+    Read one page of a folder from the userFolder-folderSortKey-index, or
+    from the sparse userFolder-unreadKey-index for unread-only listings.
+
+    Both sort keys are `<timestamp>#<emailId>`, so a descending query returns
+    the folder newest first with no filtering or client-side sort.
+    """
+    return query_index(index_name, 'userFolder', f"{user_id}#{folder}", limit, fields, start_key)
+
+def query_starred(user_id, limit, fields, start_key=None):
+    """
+    Read one page of starred emails from the sparse userId-starredAt-index,
+    most recently starred first.
+    """
+    return query_index(STARRED_INDEX, 'userId', user_id, limit, fields, start_key)
+
+def query_index(index_name, partition_key, partition_value, limit, fields, start_key=None):
+    """Run one descending, projected index query and decode the page"""
+    names = {f'#p{i}': field for i, field in enumerate(fields)}
+    names['#pk'] = partition_key
+    query_kwargs = {
+        'TableName': DYNAMODB_TABLE,
+        'IndexName': index_name,
+        'KeyConditionExpression': '#pk = :pk',
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': {':pk': {'S': partition_value}},
+        'ProjectionExpression': ', '.join(name for name in names if name != '#pk'),
+        'ScanIndexForward': False,
+        'Limit': limit
     }
+    if start_key:
+        query_kwargs['ExclusiveStartKey'] = start_key
+
+    response = dynamodb_client.query(**query_kwargs)
+    emails = [deserialize_item(item) for item in response.get('Items', [])]
+    return emails, response.get('LastEvaluatedKey')
+
+def compute_etag(user_id, params):
+    """
+    Build a strong ETag from the user's mailbox version and the query
+    parameters that shape the page. The folder indexes are eventually
+    consistent, so within INDEX_SETTLE_MS of the last mutation a page may
+    not reflect that version yet; returns None then, and the page goes
+    out untagged.
+    """
+    response = dynamodb_client.get_item(
+        TableName=MAILBOX_TABLE,
+        Key={'userId': {'S': user_id}, 'recordKey': {'S': 'summary'}},
+        ProjectionExpression='version, updatedAt',
+        ConsistentRead=True
+    )
+    item = response.get('Item', {})
+    updated_at = int(item.get('updatedAt', {}).get('N', 0))
+    if time.time() * 1000 - updated_at < INDEX_SETTLE_MS:
+        return None
+
+    version = int(item.get('version', {}).get('N', 0))
+    query = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha256(f"{user_id}:{version}:{query}".encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+def parse_if_none_match(headers):
+    """Return the set of entity tags sent in If-None-Match"""
+    for name, value in (headers or {}).items():
+        if name.lower() == 'if-none-match' and value:
+            return {tag.strip() for tag in value.split(',')}
+    return set()
+
+def encode_next_token(last_key):
+    """Encode a wire-format LastEvaluatedKey as an opaque pagination cursor"""
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_next_token(token):
+    """Decode a pagination cursor back into an ExclusiveStartKey"""
+    if not token:
+        return None
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid nextToken')
+    if not isinstance(start_key, dict) or \
+            not all(isinstance(value, dict) for value in start_key.values()):
+        raise ValueError('Invalid nextToken')
+    return start_key
@@ -1,6 +1,7 @@
 import json
 import boto3
 import os
+from vmail_common import get_cors_headers, ownership_failure_response, record_mailbox_change
 
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
@@ -10,7 +11,8 @@ DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
 
 def lambda_handler(event, context):
     """
-    Lambda function to mark an email as read
+    Lambda function to mark an email as read, or as unread when invoked
+    through the /emails/{emailId}/unread route
     """
     try:
         # Extract user info from Cognito authorizer
@@ -19,34 +21,59 @@ def lambda_handler(event, context):
         # Get email ID from path parameters
         email_id = event['pathParameters']['emailId']
 
-        # Get email metadata from DynamoDB
+        # One conditional write both checks ownership and applies the change;
+        # the old item tells us whether counters need to move
         table = dynamodb.Table(DYNAMODB_TABLE)
-        response = table.get_item(Key={'emailId': email_id})
+        conflict = dynamodb.meta.client.exceptions.ConditionalCheckFailedException
 
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'message': 'Email not found'})
-            }
+        if event.get('resource', '').endswith('/unread'):
+            # Mark as unread; unreadKey mirrors folderSortKey so the item
+            # reappears in the sparse userFolder-unreadKey-index. Items
+            # without folderSortKey aren't in the folder indexes anyway.
+            try:
+                response = table.update_item(
+                    Key={'emailId': email_id},
+                    UpdateExpression='SET #read = :read, unreadKey = if_not_exists(folderSortKey, :unreadKey)',
+                    ConditionExpression='userId = :sub',
+                    ExpressionAttributeNames={'#read': 'read'},
+                    ExpressionAttributeValues={':read': False, ':unreadKey': email_id, ':sub': user_id},
+                    ReturnValues='ALL_OLD',
+                    ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                )
+            except conflict as e:
+                return ownership_failure_response(e)
 
-        email_metadata = response['Item']
+            email_metadata = response['Attributes']
+            if email_metadata.get('read', False):
+                folder = email_metadata.get('folder')
+                record_mailbox_change(user_id, 'update', email_id, {'read': False},
+                                      counters={f'{folder}Unread': 1})
 
-        # Verify user has access to this email
-        if email_metadata.get('userId') != user_id:
             return {
-                'statusCode': 403,
+                'statusCode': 200,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'message': 'Access denied'})
+                'body': json.dumps({'message': 'Email marked as unread'})
             }
 
         # Mark as read
-        table.update_item(
-            Key={'emailId': email_id},
-            UpdateExpression='SET #read = :read',
-            ExpressionAttributeNames={'#read': 'read'},
-            ExpressionAttributeValues={':read': True}
-        )
+        try:
+            response = table.update_item(
+                Key={'emailId': email_id},
+                UpdateExpression='SET #read = :read REMOVE unreadKey',
+                ConditionExpression='userId = :sub',
+                ExpressionAttributeNames={'#read': 'read'},
+                ExpressionAttributeValues={':read': True, ':sub': user_id},
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except conflict as e:
+            return ownership_failure_response(e)
+
+        email_metadata = response['Attributes']
+        if not email_metadata.get('read', False):
+            folder = email_metadata.get('folder')
+            record_mailbox_change(user_id, 'update', email_id, {'read': True},
+                                  counters={f'{folder}Unread': -1})
 
         return {
             'statusCode': 200,
@@ -63,11 +90,3 @@ def lambda_handler(event, context):
                 'message': f'Error marking email as read: {str(e)}'
             })
         }
-
-def get_cors_headers():
-    """Return CORS headers"""
-    return {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE'
-    }
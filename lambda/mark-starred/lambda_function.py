@@ -1,6 +1,10 @@
 import json
 import boto3
 import os
+from datetime import datetime
+from vmail_common import (
+    get_cors_headers, ownership_failure_response, parse_json_body, record_mailbox_change
+)
 
 # Initialize AWS clients
 dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
@@ -20,36 +24,55 @@ def lambda_handler(event, context):
         email_id = event['pathParameters']['emailId']
 
         # Parse request body to get starred status
-        body = json.loads(event.get('body', '{}'))
+        body = parse_json_body(event)
         starred = body.get('starred', True)
 
-        # Get email metadata from DynamoDB
+        # Toggle starred status with one conditional write that also checks
+        # ownership; starredAt only exists on starred items so the
+        # userId-starredAt-index stays sparse, and trashed mail can't be
+        # starred so it stays out of the Starred listing
         table = dynamodb.Table(DYNAMODB_TABLE)
-        response = table.get_item(Key={'emailId': email_id})
-
-        if 'Item' not in response:
-            return {
-                'statusCode': 404,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'message': 'Email not found'})
+        if starred:
+            update = {
+                'UpdateExpression': 'SET starred = :starred, starredAt = :starredAt',
+                'ConditionExpression': 'userId = :sub AND folder <> :trash',
+                'ExpressionAttributeValues': {
+                    ':starred': True,
+                    ':starredAt': datetime.now().isoformat(),
+                    ':trash': 'trash',
+                    ':sub': user_id
+                }
+            }
+        else:
+            update = {
+                'UpdateExpression': 'SET starred = :starred REMOVE starredAt',
+                'ConditionExpression': 'userId = :sub',
+                'ExpressionAttributeValues': {':starred': False, ':sub': user_id}
             }
 
-        email_metadata = response['Item']
+        try:
+            response = table.update_item(
+                Key={'emailId': email_id},
+                ReturnValues='UPDATED_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD',
+                **update
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException as e:
+            # The old item comes back in wire format on the exception
+            old_item = e.response.get('Item', {})
+            if old_item.get('userId', {}).get('S') == user_id:
+                return {
+                    'statusCode': 409,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'message': 'Trashed emails cannot be starred'})
+                }
+            return ownership_failure_response(e)
 
-        # Verify user has access to this email
-        if email_metadata.get('userId') != user_id:
-            return {
-                'statusCode': 403,
-                'headers': get_cors_headers(),
-                'body': json.dumps({'message': 'Access denied'})
-            }
+        was_starred = 'starredAt' in response.get('Attributes', {})
 
-        # Toggle starred status
-        table.update_item(
-            Key={'emailId': email_id},
-            UpdateExpression='SET starred = :starred',
-            ExpressionAttributeValues={':starred': starred}
-        )
+        if bool(starred) != was_starred:
+            record_mailbox_change(user_id, 'update', email_id, {'starred': bool(starred)},
+                                  counters={'starredTotal': 1 if starred else -1})
 
         return {
             'statusCode': 200,
@@ -68,10 +91,3 @@ def lambda_handler(event, context):
             'headers': get_cors_headers(),
             'body': json.dumps({'message': f'Error: {str(e)}'})
         }
-
-def get_cors_headers():
-    return {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET,PUT,DELETE'
-    }
@@ -6,7 +6,7 @@ echo "================================================"
 echo "Packaging Lambda Functions for VMail"
 echo "================================================"
 
-FUNCTIONS=("send-email" "list-emails" "get-email" "delete-email" "mark-read" "receive-email")
+FUNCTIONS=("send-email" "list-emails" "get-email" "delete-email" "mark-read" "receive-email" "get-counts" "list-changes" "batch-get-emails" "get-attachment" "mark-starred" "bulk-emails" "folder-jobs" "trash-expiry" "cognito-post-confirmation")
 OUTPUT_DIR="../infrastructure/terraform"
 
 # Create output directory if it doesn't exist
@@ -38,6 +38,11 @@ for FUNCTION in "${FUNCTIONS[@]}"; do
     -x "*.DS_Store" \
     --quiet
 
+  # Python functions share helpers from common/
+  if [ -f lambda_function.py ]; then
+    zip -j $OUTPUT_DIR/$FUNCTION.zip ../common/vmail_common.py --quiet
+  fi
+
   cd ..
   echo "✓ $FUNCTION packaged successfully"
 done
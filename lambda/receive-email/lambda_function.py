@@ -1,152 +1,116 @@
 import json
 import boto3
 import os
-import email
-from datetime import datetime
+import time
+import gzip
+import io
+import re
+import binascii
+import hashlib
+import random
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parseaddr
+from urllib.parse import unquote_plus
 from email import policy
+from email.parser import BytesFeedParser
+from boto3.dynamodb.types import TypeSerializer
+from boto3.s3.transfer import TransferConfig
+from vmail_common import delete_objects, record_mailbox_change, release_body
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+# Initialize AWS clients; the writes run on the thread pool, and low-level
+# clients are safe to share across threads where resources are not
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
 s3 = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
 sns = boto3.client('sns', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
-cognito = boto3.client('cognito-idp', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
 
 # Environment variables
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'vmail-emails')
 S3_BUCKET = os.environ.get('S3_BUCKET', 'vmail-emails-bucket')
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
-USER_POOL_ID = os.environ.get('USER_POOL_ID', 'us-east-1_mCoiqnWRI')
+USER_EMAILS_TABLE = os.environ.get('USER_EMAILS_TABLE', 'vmail-user-emails')
+BODIES_TABLE = os.environ.get('BODIES_TABLE', 'vmail-bodies')
+INLINE_BODY_MAX_BYTES = int(os.environ.get('INLINE_BODY_MAX_BYTES', 8192))
+STREAM_CHUNK_BYTES = 256 * 1024
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 8))
+MAX_UNPROCESSED_RETRIES = 5
+
+# Reused across warm invocations for concurrent body uploads and
+# per-recipient writes; tasks share the module-level clients
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+# Keep attachment uploads to a couple of in-flight parts so peak memory
+# stays bounded regardless of attachment size
+ATTACHMENT_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=2
+)
+
+# Recipient -> user lookups are cached per container. Unknown recipients are
+# cached too (for less time) so spam to made-up addresses stays cheap
+USER_CACHE_MAX_ENTRIES = 1024
+USER_CACHE_TTL_SECONDS = 300
+USER_CACHE_NEGATIVE_TTL_SECONDS = 60
+user_cache = OrderedDict()
+
+serializer = TypeSerializer()
+
+# Crockford base32, as used by ULIDs
+ULID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Fields carried by change-log inserts, matching the list-emails row shape
+LIST_FIELDS = ('emailId', 'from', 'to', 'subject', 'preview', 'timestamp', 'read',
+               'starred', 'hasAttachments', 'isDraft', 'folder')
 
 def lambda_handler(event, context):
     """
     Lambda function to process incoming emails from SES
-    Triggered by S3 events when SES receives an email
+    Triggered by S3 events when SES receives an email, either directly or
+    in batches through the inbound SQS queue
     """
+    records = event.get('Records', [])
+    if records and records[0].get('eventSource') == 'aws:sqs':
+        return handle_sqs_batch(records)
+
+    failed = []
+    delivered = []
     try:
         # Parse S3 event
-        for record in event['Records']:
+        for record in records:
             # Get S3 bucket and key from event
             bucket = record['s3']['bucket']['name']
-            key = record['s3']['object']['key']
+            key = unquote_plus(record['s3']['object']['key'])
 
             print(f"Processing email from S3: {bucket}/{key}")
 
-            # Get email from S3
-            response = s3.get_object(Bucket=bucket, Key=key)
-            raw_email = response['Body'].read()
-
-            # Parse email
-            msg = email.message_from_bytes(raw_email, policy=policy.default)
-
-            # Extract email metadata
-            from_address = msg.get('From', '')
-            to_addresses = msg.get('To', '').split(',')
-            cc_addresses = msg.get('Cc', '').split(',') if msg.get('Cc') else []
-            subject = msg.get('Subject', '')
-            message_id = msg.get('Message-ID', '')
-            date = msg.get('Date', '')
-
-            # Extract body
-            body = ''
-            attachments = []
-
-            if msg.is_multipart():
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = str(part.get('Content-Disposition', ''))
-
-                    # Extract body
-                    if content_type == 'text/plain' and 'attachment' not in content_disposition:
-                        body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                    elif content_type == 'text/html' and not body and 'attachment' not in content_disposition:
-                        body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-
-                    # Extract attachments
-                    elif 'attachment' in content_disposition:
-                        filename = part.get_filename()
-                        if filename:
-                            attachments.append({
-                                'filename': filename,
-                                'contentType': content_type,
-                                'size': len(part.get_payload(decode=True))
-                            })
-            else:
-                body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-
-            # Find recipient user(s) in Cognito
-            # Note: In production, you'd query Cognito to get the user ID
-            # For now, we'll use the recipient email as the userId
-            for to_address in to_addresses:
-                to_address = to_address.strip()
-                user_id = get_user_id_from_email(to_address)
-
-                if not user_id:
-                    print(f"User not found for email: {to_address}")
-                    continue
-
-                # Generate unique email ID
-                email_id = f"{user_id}-{int(datetime.now().timestamp() * 1000)}"
-                timestamp = datetime.now().isoformat()
-
-                # Store full email content in S3
-                s3_key = f"emails/{user_id}/{email_id}.json"
-                s3.put_object(
-                    Bucket=S3_BUCKET,
-                    Key=s3_key,
-                    Body=json.dumps({
-                        'subject': subject,
-                        'body': body,
-                        'from': from_address,
-                        'to': to_addresses,
-                        'cc': cc_addresses,
-                        'attachments': attachments,
-                        'timestamp': timestamp,
-                        'messageId': message_id
-                    }),
-                    ContentType='application/json'
-                )
-
-                # Store metadata in DynamoDB
-                table = dynamodb.Table(DYNAMODB_TABLE)
-                table.put_item(
-                    Item={
-                        'emailId': email_id,
-                        'userId': user_id,
-                        'from': from_address,
-                        'to': [to_address],
-                        'cc': cc_addresses,
-                        'subject': subject,
-                        'preview': body[:100] if body else '',
-                        'timestamp': timestamp,
-                        'folder': 'inbox',
-                        'read': False,
-                        'starred': False,
-                        'hasAttachments': len(attachments) > 0,
-                        's3Key': s3_key,
-                        'messageId': message_id,
-                        'isDraft': False
-                    }
-                )
-
-                # Send SNS notification
-                if SNS_TOPIC_ARN:
-                    try:
-                        sns.publish(
-                            TopicArn=SNS_TOPIC_ARN,
-                            Subject='New Email Received',
-                            Message=json.dumps({
-                                'userId': user_id,
-                                'emailId': email_id,
-                                'from': from_address,
-                                'subject': subject,
-                                'timestamp': timestamp
-                            })
-                        )
-                        print(f"SNS notification sent for email {email_id}")
-                    except Exception as e:
-                        print(f"Error sending SNS notification: {str(e)}")
-
-                print(f"Email processed successfully: {email_id}")
+            deliveries = prepare_deliveries(bucket, key)
+
+            for group in group_by_body(deliveries):
+                store_body(group[0]['body'], [delivery['item']['emailId'] for delivery in group])
+
+            # Fan out the per-recipient writes; one failure doesn't stop the rest
+            futures = {executor.submit(deliver, delivery): delivery for delivery in deliveries}
+            for future, delivery in futures.items():
+                try:
+                    item = future.result()
+                    if item:
+                        delivered.append(item)
+                except Exception as e:
+                    print(f"Error delivering email {delivery['item']['emailId']}: {str(e)}")
+                    failed.append(delivery['item']['emailId'])
+
+        publish_notifications(delivered)
+
+        if failed:
+            return {
+                'statusCode': 500,
+                'body': json.dumps({
+                    'message': 'Some recipients could not be delivered',
+                    'failed': failed
+                })
+            }
 
         return {
             'statusCode': 200,
@@ -155,6 +119,8 @@ def lambda_handler(event, context):
 
     except Exception as e:
         print(f"Error processing email: {str(e)}")
+        # Still notify for whatever was delivered; a retry will skip those
+        publish_notifications(delivered)
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -162,28 +128,479 @@ def lambda_handler(event, context):
             })
         }
 
-def get_user_id_from_email(email_address):
+def handle_sqs_batch(records):
     """
-    Get user ID from Cognito based on email address
+    Process a batch of SQS messages, each wrapping an S3 event notification.
+    Shared bodies are stored and metadata items conditionally written
+    concurrently; only messages that failed are reported back for retry.
     """
+    failed = set()
+    deliveries = []
+    seen = set()
+
+    for record in records:
+        message_id = record['messageId']
+        try:
+            notification = json.loads(record['body'])
+            # S3 sends a test event when the notification is first configured
+            for s3_record in notification.get('Records', []):
+                bucket = s3_record['s3']['bucket']['name']
+                key = unquote_plus(s3_record['s3']['object']['key'])
+                print(f"Processing email from S3: {bucket}/{key}")
+                for delivery in prepare_deliveries(bucket, key):
+                    # S3 can notify twice for the same object within a batch
+                    if delivery['item']['emailId'] in seen:
+                        continue
+                    seen.add(delivery['item']['emailId'])
+                    delivery['messageId'] = message_id
+                    deliveries.append(delivery)
+        except Exception as e:
+            print(f"Error parsing message {message_id}: {str(e)}")
+            failed.add(message_id)
+
+    # Store each shared body once, concurrently on the shared client
+    futures = {
+        executor.submit(store_body, group[0]['body'],
+                        [delivery['item']['emailId'] for delivery in group]): group
+        for group in group_by_body(deliveries)
+    }
+    for future, group in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error storing body {group[0]['body']['ref']}: {str(e)}")
+            failed |= {delivery['messageId'] for delivery in group}
+
+    # Each item is written under attribute_not_exists(emailId), so a
+    # redelivered message neither duplicates the item nor counts it twice
+    futures = {
+        executor.submit(deliver, delivery): delivery
+        for delivery in deliveries if delivery['messageId'] not in failed
+    }
+    delivered = []
+    for future, delivery in futures.items():
+        try:
+            item = future.result()
+            if item:
+                delivered.append(item)
+        except Exception as e:
+            print(f"Error delivering email {delivery['item']['emailId']}: {str(e)}")
+            failed.add(delivery['messageId'])
+
+    # Notify for every new item, even when another recipient of the same
+    # message failed; the retry skips the ones already written
+    publish_notifications(delivered)
+
+    print(f"Processed {len(records) - len(failed)} of {len(records)} messages")
+    return {
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in sorted(failed)]
+    }
+
+def deliver(delivery):
+    """
+    Conditionally write one recipient's item and record the change. Returns
+    the item, or None when it was already ingested.
+    """
+    email_id = delivery['item']['emailId']
     try:
-        # List all users and search for matching email
-        paginator = cognito.get_paginator('list_users')
-        page_iterator = paginator.paginate(UserPoolId=USER_POOL_ID)
-
-        for page in page_iterator:
-            for user in page['Users']:
-                # Check user attributes for email match
-                for attr in user['Attributes']:
-                    if attr['Name'] == 'email' and attr['Value'].lower() == email_address.lower():
-                        # Get the sub (user ID) from attributes
-                        for sub_attr in user['Attributes']:
-                            if sub_attr['Name'] == 'sub':
-                                print(f"Found user {sub_attr['Value']} for email {email_address}")
-                                return sub_attr['Value']
-
-        print(f"No user found for email: {email_address}")
-        return None
-    except Exception as e:
-        print(f"Error looking up user: {str(e)}")
+        dynamodb_client.put_item(
+            TableName=DYNAMODB_TABLE,
+            Item=serialize_item(delivery['item']),
+            ConditionExpression='attribute_not_exists(emailId)',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException as e:
+        print(f"Email already ingested, skipping: {email_id}")
+        # References are keyed by email ID, so when the existing item holds
+        # this body the reference store_body took is already its own. Only
+        # one that no item holds is released.
+        body_ref = delivery['item'].get('bodyRef')
+        if body_ref and e.response.get('Item', {}).get('bodyRef', {}).get('S') != body_ref:
+            delete_objects(release_body(body_ref, email_id))
         return None
+    finish_delivery(delivery)
+    return delivery['item']
+
+def serialize_item(item):
+    """Convert a plain item dict to DynamoDB wire format"""
+    return {key: serializer.serialize(value) for key, value in item.items()}
+
+def make_email_id(user_id, arrival, source_key, recipient):
+    """
+    Build a deterministic, time-sortable email ID: a ULID whose 48-bit time
+    part is the arrival time and whose 80-bit tail hashes the source object
+    and recipient, so a redelivered message maps onto the same item
+    """
+    millis = int(arrival.timestamp() * 1000)
+    digest = hashlib.sha256(f"{source_key}\n{recipient}".encode('utf-8')).digest()
+    value = (millis << 80) | int.from_bytes(digest[:10], 'big')
+
+    chars = []
+    for _ in range(26):
+        chars.append(ULID_ALPHABET[value & 31])
+        value >>= 5
+    return f"{user_id}-{''.join(reversed(chars))}"
+
+def prepare_deliveries(bucket, key):
+    """
+    Parse one raw inbound message and build a delivery (metadata item plus
+    body to store) for each local recipient
+    """
+    # Stream the raw message through the MIME parser; attachments
+    # are decoded straight into their own S3 objects
+    msg, attachments, arrival = parse_email_stream(bucket, key)
+    # Stored as naive UTC to match the other handlers' timestamps
+    timestamp = arrival.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+
+    # Extract email metadata
+    from_address = msg.get('From', '')
+    to_addresses = msg.get('To', '').split(',')
+    cc_addresses = msg.get('Cc', '').split(',') if msg.get('Cc') else []
+    subject = msg.get('Subject', '')
+    message_id = msg.get('Message-ID', '')
+
+    body = extract_body(msg)
+
+    # Every recipient gets the same message JSON, so it is stored once under
+    # its content hash: inline when it compresses small enough, otherwise in S3
+    content = json.dumps({
+        'subject': subject,
+        'body': body,
+        'from': from_address,
+        'to': to_addresses,
+        'cc': cc_addresses,
+        'attachments': attachments,
+        'timestamp': timestamp,
+        'messageId': message_id
+    }, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    body_ref = hashlib.sha256(content).hexdigest()
+    compressed_content = gzip.compress(content)
+    inline = len(compressed_content) <= INLINE_BODY_MAX_BYTES
+
+    shared_body = {
+        'ref': body_ref,
+        'key': None if inline else f"bodies/{body_ref}.json",
+        'content': None if inline else content
+    }
+    # Objects removed once the last recipient's copy is deleted
+    shared_body['objectKeys'] = ([shared_body['key']] if shared_body['key'] else []) + \
+        [attachment['key'] for attachment in attachments]
+
+    # Resolve all recipients up front through the address mapping table
+    recipients = {}
+    for to_address in to_addresses:
+        recipients.setdefault(parseaddr(to_address)[1].strip().lower(), to_address.strip())
+    recipients.pop('', None)
+    user_ids = resolve_user_ids(list(recipients))
+
+    deliveries = {}
+    for address, to_address in recipients.items():
+        user_id = user_ids.get(address)
+
+        if not user_id:
+            print(f"User not found for email: {to_address}")
+            continue
+
+        # Same message and recipient always yield the same ID
+        email_id = make_email_id(user_id, arrival, key, address)
+        if email_id in deliveries:
+            continue
+
+        # Store metadata in DynamoDB
+        item = {
+            'emailId': email_id,
+            'userId': user_id,
+            'from': from_address,
+            'to': [to_address],
+            'cc': cc_addresses,
+            'subject': subject,
+            'preview': body[:100] if body else '',
+            'timestamp': timestamp,
+            'folder': 'inbox',
+            'userFolder': f"{user_id}#inbox",
+            'folderSortKey': f"{timestamp}#{email_id}",
+            'unreadKey': f"{timestamp}#{email_id}",
+            'read': False,
+            'starred': False,
+            'hasAttachments': len(attachments) > 0,
+            'messageId': message_id,
+            'isDraft': False
+        }
+        if attachments:
+            item['attachments'] = attachments
+        if inline:
+            item['inlineContent'] = compressed_content
+        else:
+            item['s3Key'] = shared_body['key']
+        if shared_body['objectKeys']:
+            item['bodyRef'] = body_ref
+
+        deliveries[email_id] = {'item': item, 'body': shared_body}
+
+    return list(deliveries.values())
+
+def group_by_body(deliveries):
+    """Group deliveries that share a stored body"""
+    groups = {}
+    for delivery in deliveries:
+        groups.setdefault(delivery['body']['ref'], []).append(delivery)
+    return list(groups.values())
+
+def store_body(shared_body, email_ids):
+    """
+    Take references on a shared body and upload it if it lives in S3.
+    References are the set of email IDs holding the body, so a redelivery
+    adds nothing. They are taken before the PUT, so a failure can only
+    leak the objects, never delete them from under a live item.
+    """
+    if not shared_body['objectKeys']:
+        return
+
+    dynamodb_client.update_item(
+        TableName=BODIES_TABLE,
+        Key={'bodyRef': {'S': shared_body['ref']}},
+        UpdateExpression='SET objectKeys = if_not_exists(objectKeys, :keys) ADD refs :ids',
+        ExpressionAttributeValues={
+            ':keys': serializer.serialize(shared_body['objectKeys']),
+            ':ids': {'SS': sorted(set(email_ids))}
+        }
+    )
+
+    if shared_body['content'] is not None:
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=shared_body['key'],
+            Body=shared_body['content'],
+            ContentType='application/json'
+        )
+
+def finish_delivery(delivery):
+    """Record the mailbox change once the item is written"""
+    item = delivery['item']
+    user_id = item['userId']
+    email_id = item['emailId']
+
+    record_mailbox_change(
+        user_id, 'insert', email_id,
+        {field: item[field] for field in LIST_FIELDS},
+        counters={'inboxTotal': 1, 'inboxUnread': 1}
+    )
+
+    print(f"Email processed successfully: {email_id}")
+
+def publish_notifications(items):
+    """
+    Send the invocation's new-mail notifications with PublishBatch, 10 per
+    call. Several messages for the same user are coalesced into a single
+    "N new messages" notification about the latest one.
+    """
+    if not SNS_TOPIC_ARN or not items:
+        return
+
+    by_user = {}
+    for item in items:
+        by_user.setdefault(item['userId'], []).append(item)
+
+    entries = []
+    for user_id, user_items in by_user.items():
+        user_items.sort(key=lambda item: item['folderSortKey'])
+        latest = user_items[-1]
+        message = {
+            'userId': user_id,
+            'emailId': latest['emailId'],
+            'from': latest['from'],
+            'subject': latest['subject'],
+            'timestamp': latest['timestamp']
+        }
+        if len(user_items) > 1:
+            message['count'] = len(user_items)
+            message['emailIds'] = [item['emailId'] for item in user_items]
+        entries.append({
+            'Id': str(len(entries)),
+            'Subject': 'New Email Received' if len(user_items) == 1 else f'{len(user_items)} New Emails Received',
+            'Message': json.dumps(message)
+        })
+
+    for start in range(0, len(entries), 10):
+        chunk = entries[start:start + 10]
+        try:
+            response = sns.publish_batch(TopicArn=SNS_TOPIC_ARN, PublishBatchRequestEntries=chunk)
+            for failure in response.get('Failed', []):
+                print(f"Error sending SNS notification {failure['Id']}: {failure.get('Message')}")
+            print(f"SNS notifications sent: {len(response.get('Successful', []))}")
+        except Exception as e:
+            print(f"Error sending SNS notifications: {str(e)}")
+
+def parse_email_stream(bucket, key):
+    """
+    Feed the raw message from S3 into the MIME parser chunk by chunk, then
+    stream-decode each attachment part into its own S3 object. Returns the
+    parsed message, the attachment manifest and the object's arrival time.
+    """
+    response = s3.get_object(Bucket=bucket, Key=key)
+    parser = BytesFeedParser(policy=policy.default)
+    for chunk in response['Body'].iter_chunks(chunk_size=STREAM_CHUNK_BYTES):
+        parser.feed(chunk)
+    msg = parser.close()
+
+    attachments = []
+    if msg.is_multipart():
+        for part in msg.walk():
+            if part.is_multipart() or part.get_content_disposition() != 'attachment':
+                continue
+            filename = part.get_filename()
+            if not filename:
+                continue
+
+            index = len(attachments)
+            safe_name = re.sub(r'[^\w.-]', '_', filename)
+            attachment_key = f"attachments/{key}/{index}-{safe_name}"
+            content_type = part.get_content_type()
+
+            stream = DecodedPayloadStream(part.get_payload(), part.get('Content-Transfer-Encoding', ''))
+            s3.upload_fileobj(
+                stream, S3_BUCKET, attachment_key,
+                ExtraArgs={'ContentType': content_type},
+                Config=ATTACHMENT_TRANSFER_CONFIG
+            )
+            # Drop the encoded text now that it lives in S3
+            part.set_payload('')
+
+            attachments.append({
+                'filename': filename,
+                'contentType': content_type,
+                'size': stream.size,
+                'key': attachment_key
+            })
+
+    arrival = response.get('LastModified') or datetime.now(timezone.utc)
+    return msg, attachments, arrival
+
+def extract_body(msg):
+    """Return the plain-text body, falling back to HTML"""
+    if not msg.is_multipart():
+        payload = msg.get_payload(decode=True) or b''
+        return payload.decode('utf-8', errors='ignore')
+
+    body = ''
+    for part in msg.walk():
+        if part.get_content_disposition() == 'attachment':
+            continue
+        content_type = part.get_content_type()
+        if content_type == 'text/plain' or (content_type == 'text/html' and not body):
+            payload = part.get_payload(decode=True) or b''
+            body = payload.decode('utf-8', errors='ignore')
+    return body
+
+class DecodedPayloadStream(io.RawIOBase):
+    """
+    Read-only file object that decodes a MIME part's transfer encoding in
+    bounded chunks, counting decoded bytes as they are read
+    """
+    def __init__(self, payload, transfer_encoding):
+        self._chunks = iter_decoded_chunks(payload, transfer_encoding.strip().lower())
+        self._buffer = b''
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        self.size += count
+        return count
+
+def iter_decoded_chunks(payload, transfer_encoding):
+    """Yield the decoded bytes of an encoded payload a block of lines at a time"""
+    if isinstance(payload, bytes):
+        yield payload
+        return
+    if transfer_encoding not in ('base64', 'quoted-printable'):
+        yield payload.encode('utf-8', errors='surrogateescape')
+        return
+
+    pending = ''
+    position = 0
+    while position < len(payload):
+        end = payload.find('\n', position + STREAM_CHUNK_BYTES)
+        end = len(payload) if end == -1 else end + 1
+        block = payload[position:end]
+        position = end
+
+        if transfer_encoding == 'quoted-printable':
+            yield binascii.a2b_qp(block)
+            continue
+
+        # base64 must be decoded in whole 4-character groups
+        pending += ''.join(block.split())
+        usable = len(pending) - len(pending) % 4
+        if usable:
+            yield binascii.a2b_base64(pending[:usable])
+            pending = pending[usable:]
+
+    if pending:
+        yield binascii.a2b_base64(pending + '=' * (-len(pending) % 4))
+
+def resolve_user_ids(addresses):
+    """
+    Resolve normalized recipient addresses to user IDs via the mapping table
+    kept in sync by the Cognito post-confirmation trigger. Cache hits are
+    answered from the LRU/TTL cache and the rest with one BatchGetItem.
+    Only addresses that were looked up and are absent resolve to None; a
+    failed lookup raises so the message is retried rather than dropping
+    the recipient.
+    """
+    now = time.time()
+    user_ids = {}
+    misses = []
+    for address in addresses:
+        cached = user_cache.get(address)
+        if cached and cached[1] > now:
+            user_cache.move_to_end(address)
+            user_ids[address] = cached[0]
+        else:
+            misses.append(address)
+
+    for start in range(0, len(misses), 100):
+        chunk = misses[start:start + 100]
+        request = {
+            USER_EMAILS_TABLE: {
+                'Keys': [{'email': {'S': address}} for address in chunk],
+                'ProjectionExpression': 'email, userId'
+            }
+        }
+        found = {}
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            response = dynamodb_client.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(USER_EMAILS_TABLE, []):
+                found[item['email']['S']] = item['userId']['S']
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+            if attempt < MAX_UNPROCESSED_RETRIES:
+                time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+
+        if request:
+            # Nothing from a partial lookup is cached; the retry asks again
+            raise RuntimeError(
+                f"{len(request[USER_EMAILS_TABLE]['Keys'])} recipient lookups left unprocessed"
+            )
+
+        for address in chunk:
+            user_id = found.get(address)
+            ttl = USER_CACHE_TTL_SECONDS if user_id else USER_CACHE_NEGATIVE_TTL_SECONDS
+            user_cache[address] = (user_id, now + ttl)
+            user_cache.move_to_end(address)
+            user_ids[address] = user_id
+
+    while len(user_cache) > USER_CACHE_MAX_ENTRIES:
+        user_cache.popitem(last=False)
+
+    return user_ids
@@ -4,6 +4,10 @@ const dynamodb = new AWS.DynamoDB.DocumentClient({ region: 'us-east-1' });
 const s3 = new AWS.S3({ region: 'ap-south-2' });
 
 const DYNAMODB_TABLE = process.env.DYNAMODB_TABLE || 'vmail-emails';
+const MAILBOX_TABLE = process.env.MAILBOX_TABLE || 'vmail-mailbox';
+const CHANGE_LOG_TTL_SECONDS = parseInt(process.env.CHANGE_LOG_TTL_SECONDS || String(7 * 24 * 3600), 10);
+const LIST_FIELDS = ['emailId', 'from', 'to', 'subject', 'preview', 'timestamp', 'read',
+  'starred', 'hasAttachments', 'isDraft', 'folder'];
 const S3_BUCKET = process.env.S3_BUCKET || 'vmail-emails-059409992687';
 
 exports.handler = async (event, context) => {
@@ -15,7 +19,11 @@ exports.handler = async (event, context) => {
     console.log('User:', userEmail, 'UserId:', userId);
 
     // Parse request body
-    const body = JSON.parse(event.body);
+    // The API accepts */* as binary, so JSON bodies may arrive base64 encoded
+    const rawBody = event.isBase64Encoded
+      ? Buffer.from(event.body, 'base64').toString('utf8')
+      : event.body;
+    const body = JSON.parse(rawBody);
     const { to, subject, body: emailBody, cc = [], bcc = [], attachments = [], draftId } = body;
     console.log('Saving draft for:', to, 'Subject:', subject);
 
@@ -43,27 +51,60 @@ exports.handler = async (event, context) => {
 
     // Store metadata in DynamoDB
     console.log('Storing draft in DynamoDB');
-    await dynamodb.put({
-      TableName: DYNAMODB_TABLE,
-      Item: {
+    const content = {
+      from: userEmail,
+      to: Array.isArray(to) ? to : [to],
+      cc,
+      bcc,
+      subject,
+      preview: emailBody.replace(/<[^>]*>/g, '').substring(0, 100),
+      timestamp,
+      folderSortKey: `${timestamp}#${emailId}`,
+      hasAttachments: attachments.length > 0,
+      s3Key
+    };
+
+    // Re-saving only replaces the content, so the draft keeps its folder and
+    // star and the counters stay as they are
+    let item = draftId ? await updateDraft(userId, emailId, content) : null;
+    const created = !item;
+    if (created) {
+      item = {
         emailId,
         userId,
-        from: userEmail,
-        to: Array.isArray(to) ? to : [to],
-        cc,
-        bcc,
-        subject,
-        preview: emailBody.replace(/<[^>]*>/g, '').substring(0, 100),
-        timestamp,
+        ...content,
         folder: 'drafts',
+        userFolder: `${userId}#drafts`,
         read: true,
         starred: false,
-        hasAttachments: attachments.length > 0,
-        s3Key,
         isDraft: true
+      };
+      try {
+        await dynamodb.put({
+          TableName: DYNAMODB_TABLE,
+          Item: item,
+          ConditionExpression: 'attribute_not_exists(emailId)'
+        }).promise();
+      } catch (error) {
+        if (error.code !== 'ConditionalCheckFailedException') {
+          throw error;
+        }
+        // The ID exists but isn't one of this user's drafts
+        return {
+          statusCode: 403,
+          headers: getCorsHeaders(),
+          body: JSON.stringify({ message: 'Access denied' })
+        };
       }
-    }).promise();
+    }
     console.log('Draft saved successfully');
+    await recordMailboxChange(
+      userId,
+      created ? 'insert' : 'update',
+      emailId,
+      pickListFields(item),
+      created ? { draftsTotal: 1 } : {}
+    );
 
     return {
       statusCode: 200,
@@ -86,6 +127,83 @@ exports.handler = async (event, context) => {
   }
 };
 
+async function updateDraft(userId, emailId, content) {
+  // Update an existing draft's content fields in place, checking ownership
+  // in the same write. Returns the updated item, or null when there is no
+  // such draft of this user's.
+  const names = {};
+  const values = { ':sub': userId, ':isDraft': true };
+  const clauses = Object.entries(content).map(([field, value], i) => {
+    names[`#f${i}`] = field;
+    values[`:f${i}`] = value;
+    return `#f${i} = :f${i}`;
+  });
+
+  try {
+    const result = await dynamodb.update({
+      TableName: DYNAMODB_TABLE,
+      Key: { emailId },
+      UpdateExpression: `SET ${clauses.join(', ')}`,
+      ConditionExpression: 'userId = :sub AND isDraft = :isDraft',
+      ExpressionAttributeNames: names,
+      ExpressionAttributeValues: values,
+      ReturnValues: 'ALL_NEW'
+    }).promise();
+    return result.Attributes;
+  } catch (error) {
+    if (error.code === 'ConditionalCheckFailedException') {
+      return null;
+    }
+    throw error;
+  }
+}
+
+async function recordMailboxChange(userId, op, emailId, fields = {}, counters = {}) {
+  // Bump the user's mailbox version, apply counter deltas and append the
+  // change to the mailbox change log read by GET /emails/changes.
+  // updatedAt lets list-emails wait out index lag before trusting the version
+  const names = { '#version': 'version' };
+  const values = { ':one': 1, ':now': Date.now() };
+  const clauses = ['#version :one'];
+  Object.entries(counters).filter(([, delta]) => delta).forEach(([name, delta], i) => {
+    names[`#c${i}`] = name;
+    values[`:c${i}`] = delta;
+    clauses.push(`#c${i} :c${i}`);
+  });
+
+  try {
+    const result = await dynamodb.update({
+      TableName: MAILBOX_TABLE,
+      Key: { userId, recordKey: 'summary' },
+      UpdateExpression: `SET updatedAt = :now ADD ${clauses.join(', ')}`,
+      ExpressionAttributeNames: names,
+      ExpressionAttributeValues: values,
+      ReturnValues: 'UPDATED_NEW'
+    }).promise();
+    const version = result.Attributes.version;
+
+    await dynamodb.put({
+      TableName: MAILBOX_TABLE,
+      Item: {
+        userId,
+        recordKey: `change#${String(version).padStart(12, '0')}`,
+        version,
+        op,
+        emailId,
+        fields,
+        expiresAt: Math.floor(Date.now() / 1000) + CHANGE_LOG_TTL_SECONDS
+      }
+    }).promise();
+  } catch (error) {
+    console.error('Error recording mailbox change:', error);
+  }
+}
+
+function pickListFields(item) {
+  // Fields carried by change-log entries, matching the list-emails row shape
+  return Object.fromEntries(LIST_FIELDS.map(field => [field, item[field]]));
+}
+
 function getCorsHeaders() {
   return {
     'Access-Control-Allow-Origin': '*',
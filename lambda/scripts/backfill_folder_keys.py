@@ -0,0 +1,116 @@
+"""
+One-time backfill for emails written before the folder index and the
+mailbox counters existed. Sets userFolder, folderSortKey and (on unread
+items) unreadKey so older mail shows up in the folder listings, gives
+starred mail outside the trash a starredAt, and seeds each user's
+<folder>Total, <folder>Unread and starredTotal counters on the mailbox
+summary from a full count.
+
+The counters are overwritten, so run it before the counter-maintaining
+functions go live or while inbound mail is paused.
+
+Usage:
+    python backfill_folder_keys.py [emails-table] [mailbox-table]
+"""
+import sys
+import boto3
+import os
+
+region = os.environ.get('AWS_REGION', 'us-east-1')
+dynamodb = boto3.resource('dynamodb', region_name=region)
+
+FOLDERS = ('inbox', 'sent', 'drafts', 'trash')
+
+def main():
+    emails_table_name = sys.argv[1] if len(sys.argv) > 1 else 'vmail-emails'
+    mailbox_table_name = sys.argv[2] if len(sys.argv) > 2 else 'vmail-mailbox'
+    emails_table = dynamodb.Table(emails_table_name)
+    mailbox_table = dynamodb.Table(mailbox_table_name)
+
+    counters = {}
+    updated = 0
+    skipped = 0
+    scan_kwargs = {
+        'ProjectionExpression': 'emailId, userId, folder, #timestamp, #read, starred, starredAt, '
+                                'userFolder, folderSortKey, unreadKey',
+        'ExpressionAttributeNames': {'#timestamp': 'timestamp', '#read': 'read'}
+    }
+    while True:
+        response = emails_table.scan(**scan_kwargs)
+        for item in response['Items']:
+            if not item.get('userId') or not item.get('folder'):
+                skipped += 1
+                continue
+            try:
+                if backfill_item(emails_table, item):
+                    updated += 1
+            except emails_table.meta.client.exceptions.ConditionalCheckFailedException:
+                # Deleted since the scan
+                continue
+            if item['userId'] not in counters:
+                counters[item['userId']] = {'starredTotal': 0}
+                for folder in FOLDERS:
+                    counters[item['userId']].update({f'{folder}Total': 0, f'{folder}Unread': 0})
+            count_item(counters[item['userId']], item)
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    for user_id, user_counters in counters.items():
+        seed_counters(mailbox_table, user_id, user_counters)
+
+    print(f"Backfilled {updated} emails in {emails_table_name} ({skipped} skipped)")
+    print(f"Seeded counters for {len(counters)} users in {mailbox_table_name}")
+
+def backfill_item(table, item):
+    """Add whichever index keys the item is missing; returns whether it changed"""
+    email_id = item['emailId']
+    folder = item['folder']
+    sort_key = item.get('folderSortKey') or f"{item.get('timestamp', '')}#{email_id}"
+    unread = not item.get('read', False)
+
+    updates = {}
+    if 'userFolder' not in item:
+        updates['userFolder'] = f"{item['userId']}#{folder}"
+    if 'folderSortKey' not in item:
+        updates['folderSortKey'] = sort_key
+    if unread and 'unreadKey' not in item:
+        updates['unreadKey'] = sort_key
+    # Starred used to be a flag alone; trashed mail isn't listed as starred
+    if item.get('starred') and folder != 'trash' and 'starredAt' not in item:
+        updates['starredAt'] = item.get('timestamp') or sort_key
+    if not updates:
+        return False
+
+    # Conditional so an email deleted since the scan isn't recreated
+    table.update_item(
+        Key={'emailId': email_id},
+        UpdateExpression='SET ' + ', '.join(f'#f{i} = :f{i}' for i in range(len(updates))),
+        ConditionExpression='attribute_exists(emailId)',
+        ExpressionAttributeNames={f'#f{i}': name for i, name in enumerate(updates)},
+        ExpressionAttributeValues={f':f{i}': value for i, value in enumerate(updates.values())}
+    )
+    item.update(updates)
+    return True
+
+def count_item(user_counters, item):
+    """Add one email to its owner's folder, unread and starred counts"""
+    folder = item['folder']
+    user_counters[f'{folder}Total'] = user_counters.get(f'{folder}Total', 0) + 1
+    if not item.get('read', False):
+        user_counters[f'{folder}Unread'] = user_counters.get(f'{folder}Unread', 0) + 1
+    if 'starredAt' in item:
+        user_counters['starredTotal'] += 1
+
+def seed_counters(table, user_id, user_counters):
+    """Overwrite the counters on the user's mailbox summary, leaving its version alone"""
+    table.update_item(
+        Key={'userId': user_id, 'recordKey': 'summary'},
+        UpdateExpression='SET ' + ', '.join(f'#c{i} = :c{i}' for i in range(len(user_counters))),
+        ExpressionAttributeNames={f'#c{i}': name for i, name in enumerate(user_counters)},
+        ExpressionAttributeValues={f':c{i}': value for i, value in enumerate(user_counters.values())}
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+One-time backfill of the email -> user mapping table from the Cognito user
+pool, for users confirmed before the post-confirmation trigger existed.
+
+Usage:
+    python backfill_user_emails.py <user-pool-id> [table-name]
+"""
+import sys
+import boto3
+import os
+from datetime import datetime
+
+region = os.environ.get('AWS_REGION', 'us-east-1')
+cognito = boto3.client('cognito-idp', region_name=region)
+dynamodb = boto3.resource('dynamodb', region_name=region)
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    user_pool_id = sys.argv[1]
+    table_name = sys.argv[2] if len(sys.argv) > 2 else 'vmail-user-emails'
+    table = dynamodb.Table(table_name)
+
+    written = 0
+    skipped = 0
+    paginator = cognito.get_paginator('list_users')
+    with table.batch_writer(overwrite_by_pkeys=['email']) as batch:
+        for page in paginator.paginate(UserPoolId=user_pool_id):
+            for user in page['Users']:
+                attributes = {attr['Name']: attr['Value'] for attr in user['Attributes']}
+                email_address = attributes.get('email', '').strip().lower()
+                if user.get('UserStatus') != 'CONFIRMED' or not email_address or 'sub' not in attributes:
+                    skipped += 1
+                    continue
+
+                batch.put_item(
+                    Item={
+                        'email': email_address,
+                        'userId': attributes['sub'],
+                        'updatedAt': datetime.now().isoformat()
+                    }
+                )
+                written += 1
+
+    print(f"Backfilled {written} users into {table_name} ({skipped} skipped)")
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,17 @@
 const AWS = require('aws-sdk');
 const sgMail = require('@sendgrid/mail');
+const zlib = require('zlib');
 
 const dynamodb = new AWS.DynamoDB.DocumentClient({ region: 'us-east-1' });
 const s3 = new AWS.S3({ region: 'ap-south-2' });
 
 const DYNAMODB_TABLE = process.env.DYNAMODB_TABLE || 'vmail-emails';
+const MAILBOX_TABLE = process.env.MAILBOX_TABLE || 'vmail-mailbox';
+const CHANGE_LOG_TTL_SECONDS = parseInt(process.env.CHANGE_LOG_TTL_SECONDS || String(7 * 24 * 3600), 10);
+const LIST_FIELDS = ['emailId', 'from', 'to', 'subject', 'preview', 'timestamp', 'read',
+  'starred', 'hasAttachments', 'isDraft', 'folder'];
 const S3_BUCKET = process.env.S3_BUCKET || 'vmail-emails-059409992687';
+const INLINE_BODY_MAX_BYTES = parseInt(process.env.INLINE_BODY_MAX_BYTES || '8192', 10);
 const SENDGRID_API_KEY = process.env.SENDGRID_API_KEY;
 const SENDGRID_FROM_EMAIL = process.env.SENDGRID_FROM_EMAIL || 'gagan_veginati@srmap.edu.in';
 
@@ -21,7 +27,11 @@ exports.handler = async (event, context) => {
     console.log('User:', userEmail, 'UserId:', userId);
 
     // Parse request body
-    const body = JSON.parse(event.body);
+    // The API accepts */* as binary, so JSON bodies may arrive base64 encoded
+    const rawBody = event.isBase64Encoded
+      ? Buffer.from(event.body, 'base64').toString('utf8')
+      : event.body;
+    const body = JSON.parse(rawBody);
     const { to, subject, body: emailBody, cc = [], bcc = [], attachments = [] } = body;
     console.log('Email to:', to, 'Subject:', subject);
 
@@ -68,49 +78,68 @@ exports.handler = async (event, context) => {
     const messageId = sendResult[0].headers['x-message-id'] || emailId;
     console.log('Message ID:', messageId);
 
-    // Store full email in S3
-    const s3Key = `emails/${userId}/${emailId}.json`;
-    await s3.putObject({
-      Bucket: S3_BUCKET,
-      Key: s3Key,
-      Body: JSON.stringify({
-        subject,
-        body: emailBody,
-        from: userEmail,
-        to: Array.isArray(to) ? to : [to],
-        cc,
-        bcc,
-        attachments,
-        timestamp,
-        messageId
-      }),
-      ContentType: 'application/json'
-    }).promise();
+    // Store each attachment as its own S3 object; the message JSON only
+    // keeps a manifest so opening the email never downloads the payloads
+    const attachmentManifest = await storeAttachments(userId, emailId, attachments);
+
+    // Store full email inline when it compresses small enough, otherwise in S3
+    const content = JSON.stringify({
+      subject,
+      body: emailBody,
+      from: userEmail,
+      to: Array.isArray(to) ? to : [to],
+      cc,
+      bcc,
+      attachments: attachmentManifest,
+      timestamp,
+      messageId
+    });
+    const compressedContent = zlib.gzipSync(content);
+    const inline = compressedContent.length <= INLINE_BODY_MAX_BYTES;
+
+    const s3Key = inline ? null : `emails/${userId}/${emailId}.json`;
+    if (!inline) {
+      await s3.putObject({
+        Bucket: S3_BUCKET,
+        Key: s3Key,
+        Body: content,
+        ContentType: 'application/json'
+      }).promise();
+    }
 
     // Store metadata in DynamoDB
     console.log('Storing email in DynamoDB, folder: sent');
+    const item = {
+      emailId,
+      userId,
+      from: userEmail,
+      to: Array.isArray(to) ? to : [to],
+      cc,
+      bcc,
+      subject,
+      preview: emailBody.replace(/<[^>]*>/g, '').substring(0, 100),
+      timestamp,
+      folder: 'sent',
+      userFolder: `${userId}#sent`,
+      folderSortKey: `${timestamp}#${emailId}`,
+      read: true,
+      starred: false,
+      hasAttachments: attachments.length > 0,
+      attachments: attachmentManifest,
+      messageId,
+      isDraft: false
+    };
+    if (inline) {
+      item.inlineContent = compressedContent;
+    } else {
+      item.s3Key = s3Key;
+    }
     await dynamodb.put({
       TableName: DYNAMODB_TABLE,
-      Item: {
-        emailId,
-        userId,
-        from: userEmail,
-        to: Array.isArray(to) ? to : [to],
-        cc,
-        bcc,
-        subject,
-        preview: emailBody.replace(/<[^>]*>/g, '').substring(0, 100),
-        timestamp,
-        folder: 'sent',
-        read: true,
-        starred: false,
-        hasAttachments: attachments.length > 0,
-        s3Key,
-        messageId,
-        isDraft: false
-      }
+      Item: item
     }).promise();
     console.log('Email stored successfully');
+    await recordMailboxChange(userId, 'insert', emailId, pickListFields(item), { sentTotal: 1 });
 
     return {
       statusCode: 200,
@@ -135,6 +164,71 @@ exports.handler = async (event, context) => {
   }
 };
 
+async function storeAttachments(userId, emailId, attachments) {
+  // Upload decoded attachments in parallel and return their manifest
+  return Promise.all(attachments.map(async (att, index) => {
+    const data = Buffer.from(att.data || '', 'base64');
+    const filename = att.filename || `attachment-${index}`;
+    const contentType = att.contentType || 'application/octet-stream';
+    const key = `attachments/${userId}/${emailId}/${index}-${filename.replace(/[^\w.-]/g, '_')}`;
+
+    await s3.putObject({
+      Bucket: S3_BUCKET,
+      Key: key,
+      Body: data,
+      ContentType: contentType
+    }).promise();
+
+    return { filename, contentType, size: data.length, key };
+  }));
+}
+
+async function recordMailboxChange(userId, op, emailId, fields = {}, counters = {}) {
+  // Bump the user's mailbox version, apply counter deltas and append the
+  // change to the mailbox change log read by GET /emails/changes.
+  // updatedAt lets list-emails wait out index lag before trusting the version
+  const names = { '#version': 'version' };
+  const values = { ':one': 1, ':now': Date.now() };
+  const clauses = ['#version :one'];
+  Object.entries(counters).filter(([, delta]) => delta).forEach(([name, delta], i) => {
+    names[`#c${i}`] = name;
+    values[`:c${i}`] = delta;
+    clauses.push(`#c${i} :c${i}`);
+  });
+
+  try {
+    const result = await dynamodb.update({
+      TableName: MAILBOX_TABLE,
+      Key: { userId, recordKey: 'summary' },
+      UpdateExpression: `SET updatedAt = :now ADD ${clauses.join(', ')}`,
+      ExpressionAttributeNames: names,
+      ExpressionAttributeValues: values,
+      ReturnValues: 'UPDATED_NEW'
+    }).promise();
+    const version = result.Attributes.version;
+
+    await dynamodb.put({
+      TableName: MAILBOX_TABLE,
+      Item: {
+        userId,
+        recordKey: `change#${String(version).padStart(12, '0')}`,
+        version,
+        op,
+        emailId,
+        fields,
+        expiresAt: Math.floor(Date.now() / 1000) + CHANGE_LOG_TTL_SECONDS
+      }
+    }).promise();
+  } catch (error) {
+    console.error('Error recording mailbox change:', error);
+  }
+}
+
+function pickListFields(item) {
+  // Fields carried by change-log entries, matching the list-emails row shape
+  return Object.fromEntries(LIST_FIELDS.map(field => [field, item[field]]));
+}
+
 function getCorsHeaders() {
   return {
     'Access-Control-Allow-Origin': '*',
@@ -0,0 +1,85 @@
+import boto3
+import os
+import time
+from vmail_common import delete_objects, deserialize_item, object_keys_to_delete, summary_update
+
+# Initialize AWS clients
+dynamodb_client = boto3.client('dynamodb', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
+
+# Environment variables
+MAILBOX_TABLE = os.environ.get('MAILBOX_TABLE', 'vmail-mailbox')
+# Stream records are kept for 24 hours, so no replay arrives after this
+EXPIRY_MARKER_TTL_SECONDS = 2 * 24 * 3600
+
+def lambda_handler(event, context):
+    """
+    Lambda function consuming the emails table stream. Trashed emails are
+    removed by the table TTL; this releases their shared bodies, deletes
+    their own S3 objects and keeps the mailbox counters in step.
+    """
+    records = event.get('Records', [])
+    for processed, record in enumerate(records):
+        try:
+            # The event source mapping only passes TTL removals through
+            old_image = record['dynamodb'].get('OldImage')
+            if record.get('eventName') != 'REMOVE' or not old_image:
+                continue
+            # Stream images carry binary values as base64 text; the inline
+            # body isn't needed here
+            old_image.pop('inlineContent', None)
+            expire_email(deserialize_item(old_image))
+        except Exception as e:
+            # Lambda resumes the shard from the first reported record, so
+            # stop here rather than apply the later records twice
+            print(f"Error processing stream record {record.get('eventID')}: {str(e)}")
+            print(f"Processed {processed} of {len(records)} records")
+            return {'batchItemFailures': [{'itemIdentifier': record['dynamodb']['SequenceNumber']}]}
+
+    print(f"Processed {len(records)} of {len(records)} records")
+    return {'batchItemFailures': []}
+
+def expire_email(email_metadata):
+    """
+    Clean up after one email the TTL removed from the trash. Safe to run
+    again for the same email: a reference that was already released
+    yields no keys to delete, and the counters are only applied once.
+    """
+    user_id = email_metadata['userId']
+    email_id = email_metadata['emailId']
+
+    # Received bodies and attachments are shared by every recipient and
+    # only go once the last reference is released
+    delete_objects(object_keys_to_delete(email_metadata, user_id))
+
+    record_expiry(user_id, email_id, {
+        'trashTotal': -1,
+        'trashUnread': 0 if email_metadata.get('read', False) else -1
+    })
+
+def record_expiry(user_id, email_id, counters):
+    """
+    Apply the counter deltas and bump the mailbox version together with a
+    per-email marker in one transaction, so a replayed stream record finds
+    the marker and changes nothing. There is no change-log entry; as with
+    folder-wide jobs, GET /emails/changes treats the gap as a signal to
+    reload.
+    """
+    try:
+        dynamodb_client.transact_write_items(TransactItems=[
+            {'Put': {
+                'TableName': MAILBOX_TABLE,
+                'Item': {
+                    'userId': {'S': user_id},
+                    'recordKey': {'S': f"expired#{email_id}"},
+                    'expiresAt': {'N': str(int(time.time()) + EXPIRY_MARKER_TTL_SECONDS)}
+                },
+                'ConditionExpression': 'attribute_not_exists(recordKey)'
+            }},
+            {'Update': summary_update(user_id, 1, counters)}
+        ])
+    except dynamodb_client.exceptions.TransactionCanceledException as e:
+        reasons = e.response.get('CancellationReasons', [])
+        if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+            print(f"Expiry of {email_id} already counted, skipping")
+            return
+        raise